@@ -0,0 +1,158 @@
+"""
+Columnar sidecar cache for OHLCV csv files.
+
+The first load of ``AMD.csv`` parses it once and stores every column as a raw ``.npy`` array
+in ``AMD.csv.barcache/``. Later loads memory-map those arrays, so opening a multi-year file
+costs a stat call and a few mmaps instead of a full csv and timezone parse.
+The cache is rebuilt whenever the size or the modification time of the source csv changes.
+"""
+import json
+import os
+import shutil
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from backtest import ingest
+from backtest.ingest import TIME_COLUMN, PRICE_COLUMNS, COLUMNS
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.barcache'
+META_FILE = 'meta.json'
+
+
+@dataclass(frozen=True)
+class BarArrays:
+    """
+    Bars as plain numpy arrays. ``times`` holds int64 nanoseconds since epoch (UTC),
+    prices are float64 (float32 when asked for) and volume keeps the dtype it was parsed with.
+    Arrays coming from the cache are read-only memory maps.
+    """
+    times: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self):
+        return len(self.times)
+
+    @classmethod
+    def fromFrame(cls, df: pd.DataFrame) -> 'BarArrays':
+        """Bars of a frame made by toFrame, a missing Volume column is zeros"""
+        volume = df['Volume'].values if 'Volume' in df.columns else np.zeros(len(df))
+        return cls(frameTimes(df), *[df[name].values for name in PRICE_COLUMNS], volume)
+
+    def column(self, name: str) -> np.ndarray:
+        return getattr(self, name.lower())
+
+    def withPriceDtype(self, dtype) -> 'BarArrays':
+        if self.open.dtype == dtype:
+            return self
+        return BarArrays(self.times, *[self.column(name).astype(dtype) for name in PRICE_COLUMNS], self.volume)
+
+    def toFrame(self, columns=None, tz='UTC') -> pd.DataFrame:
+        columns = COLUMNS if columns is None else columns
+        data = {TIME_COLUMN: timesToIndex(self.times, tz)}
+        for name in columns:
+            data[name] = self.column(name)
+        return pd.DataFrame(data)
+
+
+def timesToIndex(times: np.ndarray, tz='UTC') -> pd.DatetimeIndex:
+    index = pd.DatetimeIndex(times.view('datetime64[ns]')).tz_localize('UTC')
+    return index if tz == 'UTC' else index.tz_convert(tz)
+
+
+def frameTimes(df: pd.DataFrame) -> np.ndarray:
+    return df[TIME_COLUMN].values.astype('datetime64[ns]', copy=False).view('int64')
+
+
+def cachePath(filename: str) -> str:
+    return filename + CACHE_SUFFIX
+
+
+def loadBars(filename: str, useCache: bool = True, float32: bool = False) -> BarArrays:
+    """The cache always keeps float64 prices, float32 bars are converted from it"""
+    if not useCache:
+        return parseCsv(filename, float32)
+
+    stat = os.stat(filename)
+    directory = cachePath(filename)
+    if isCacheValid(directory, stat):
+        return mapCache(directory).withPriceDtype(ingest.priceDtype(float32))
+
+    bars = parseCsv(filename)
+    try:
+        writeCache(directory, bars, stat)
+    except OSError:
+        # read-only location, the parsed bars are still good
+        return bars.withPriceDtype(ingest.priceDtype(float32))
+    return mapCache(directory).withPriceDtype(ingest.priceDtype(float32))
+
+
+def loadFrame(filename: str, columns=None, tz='UTC', useCache: bool = True, float32: bool = False) -> pd.DataFrame:
+    return loadBars(filename, useCache, float32).toFrame(columns, tz)
+
+
+def parseCsv(filename: str, float32: bool = False) -> BarArrays:
+    columns = ingest.readColumns(filename, float32)
+    return BarArrays(columns[TIME_COLUMN], *[columns[name] for name in COLUMNS])
+
+
+def iterCsv(filename: str, chunkRows: int, tz='UTC', float32: bool = False):
+    """Yields DateTime indexed OHLCV frames of at most chunkRows rows, without touching the cache"""
+    for times, df in ingest.iterChunks(filename, chunkRows, float32):
+        df[TIME_COLUMN] = timesToIndex(times, tz)
+        yield df.set_index(TIME_COLUMN)
+
+
+def isCacheValid(directory: str, stat: os.stat_result) -> bool:
+    meta = readMeta(directory)
+    return meta is not None \
+           and meta.get('version') == CACHE_VERSION \
+           and meta.get('sourceSize') == stat.st_size \
+           and meta.get('sourceMtimeNs') == stat.st_mtime_ns
+
+
+def readMeta(directory: str):
+    try:
+        with open(os.path.join(directory, META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def mapCache(directory: str) -> BarArrays:
+    arrays = [np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in [TIME_COLUMN] + COLUMNS]
+    return BarArrays(*arrays)
+
+
+def writeCache(directory: str, bars: BarArrays, stat: os.stat_result):
+    tmpDirectory = f'{directory}.tmp{os.getpid()}'
+    shutil.rmtree(tmpDirectory, ignore_errors=True)
+    os.makedirs(tmpDirectory)
+    try:
+        np.save(os.path.join(tmpDirectory, f'{TIME_COLUMN}.npy'), bars.times)
+        for name in COLUMNS:
+            np.save(os.path.join(tmpDirectory, f'{name}.npy'), bars.column(name))
+        # meta goes last: a directory without it is never treated as a valid cache
+        meta = {
+            'version': CACHE_VERSION,
+            'sourceSize': stat.st_size,
+            'sourceMtimeNs': stat.st_mtime_ns,
+            'rows': len(bars),
+        }
+        with open(os.path.join(tmpDirectory, META_FILE), 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmpDirectory, directory)
+    except OSError:
+        shutil.rmtree(tmpDirectory, ignore_errors=True)
+        raise
+
+
+def invalidate(filename: str):
+    shutil.rmtree(cachePath(filename), ignore_errors=True)
@@ -0,0 +1,78 @@
+import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest.barcache import timesToIndex
+
+EPOCH_DATE = datetime.date(1970, 1, 1)
+NS_PER_DAY = 24 * 60 * 60 * 10 ** 9
+
+
+class DayIndex:
+    """
+    Sorted day -> [start, end) row offsets over a time ordered int64 nanoseconds column.
+    Built with one pass over the column, every lookup afterwards is a binary search over the days.
+    """
+
+    def __init__(self, times: np.ndarray, tz='UTC'):
+        self.tz = tz
+        dayNumbers = localDayNumbers(times, tz)
+        breaks = np.flatnonzero(np.diff(dayNumbers)) + 1
+        self.starts = np.concatenate(([0], breaks)).astype('int64') if len(dayNumbers) else np.empty(0, 'int64')
+        self.ends = np.concatenate((breaks, [len(dayNumbers)])).astype('int64') if len(dayNumbers) \
+            else np.empty(0, 'int64')
+        self.days = dayNumbers[self.starts]
+
+    def __len__(self):
+        return len(self.days)
+
+    def hasDay(self, day) -> bool:
+        return self._position(day) is not None
+
+    def rowRange(self, day) -> Optional[Tuple[int, int]]:
+        position = self._position(day)
+        if position is None:
+            return None
+        return int(self.starts[position]), int(self.ends[position])
+
+    def nextDay(self, day) -> Optional[datetime.date]:
+        position = np.searchsorted(self.days, dayNumber(day), side='right')
+        return self.dayAt(position) if position < len(self.days) else None
+
+    def previousDay(self, day) -> Optional[datetime.date]:
+        position = np.searchsorted(self.days, dayNumber(day), side='left') - 1
+        return self.dayAt(position) if position >= 0 else None
+
+    def dayAt(self, position: int) -> datetime.date:
+        return EPOCH_DATE + datetime.timedelta(days=int(self.days[position]))
+
+    def firstDay(self) -> Optional[datetime.date]:
+        return self.dayAt(0) if len(self.days) else None
+
+    def _position(self, day):
+        number = dayNumber(day)
+        position = np.searchsorted(self.days, number)
+        if position < len(self.days) and self.days[position] == number:
+            return position
+        return None
+
+
+def dayNumber(day) -> int:
+    if isinstance(day, datetime.datetime):
+        day = day.date()
+    return (day - EPOCH_DATE).days
+
+
+def localDayNumbers(times: np.ndarray, tz='UTC') -> np.ndarray:
+    if tz != 'UTC':
+        times = timesToIndex(times, tz).tz_localize(None).values.astype('datetime64[ns]').view('int64')
+    return times // NS_PER_DAY
+
+
+def localDayBounds(time: int, tz='UTC') -> Tuple[datetime.date, int, int]:
+    """Local day of a nanoseconds timestamp and the nanoseconds of that day's first instant and of the next one"""
+    day = EPOCH_DATE + datetime.timedelta(days=int(localDayNumbers(np.array([time], dtype='int64'), tz)[0]))
+    start, end = [pd.Timestamp(value).tz_localize(tz).value for value in (day, day + datetime.timedelta(days=1))]
+    return day, start, end
@@ -0,0 +1,101 @@
+"""
+Headless entry/stop backtest over every day of a file.
+
+Uses the chart semantics (see ``chart.EntryStopLine``): a position is opened on the first bar of the day
+whose range contains the entry price and closed on the first later bar of the same day whose range
+contains the stop price. Days where the stop is never touched are closed at the last close of the day.
+All days of a rule are evaluated at once with numpy, there is no python loop over days or bars.
+"""
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest.barcache import BarArrays, timesToIndex, loadBars
+from backtest.dayindex import DayIndex
+from backtest.touch import touchEnvelopes
+
+NO_ROW = -1
+LONG = 1
+SHORT = -1
+LEDGER_COLUMNS = ['Day', 'EntryTime', 'EntryPrice', 'ExitTime', 'ExitPrice', 'StopHit', 'Direction', 'PnL']
+
+
+def loadDays(filename: str, tz='UTC') -> Tuple[BarArrays, DayIndex]:
+    bars = loadBars(filename)
+    return bars, DayIndex(bars.times, tz)
+
+
+def dayOpens(bars: BarArrays, dayIndex: DayIndex) -> np.ndarray:
+    return np.asarray(bars.open[dayIndex.starts])
+
+
+def dayOfRows(dayIndex: DayIndex) -> np.ndarray:
+    return np.repeat(np.arange(len(dayIndex)), dayIndex.ends - dayIndex.starts)
+
+
+def perDay(value, dayIndex: DayIndex) -> np.ndarray:
+    """Broadcasts a scalar rule value to every day, NaN means no trade (or no stop) on that day."""
+    return np.broadcast_to(np.asarray(value, dtype='float64'), (len(dayIndex),))
+
+
+def envelopes(bars: BarArrays) -> Tuple[np.ndarray, np.ndarray]:
+    return touchEnvelopes(bars.open, bars.high, bars.low, bars.close)
+
+
+def firstRowPerDay(mask: np.ndarray, dayIndex: DayIndex) -> np.ndarray:
+    size = len(mask)
+    if size == 0:
+        return np.empty(0, dtype='int64')
+    candidates = np.where(mask, np.arange(size), size)
+    first = np.minimum.reduceat(candidates, dayIndex.starts)
+    return np.where(first < size, first, NO_ROW)
+
+
+def runEntryStop(bars: BarArrays, dayIndex: DayIndex, entry, stop, direction=None, entryStartRows=None) -> pd.DataFrame:
+    """
+    Runs one entry/stop rule over every day
+
+    :param entry: entry price, a scalar or one value per day
+    :param stop: stop price, a scalar or one value per day
+    :param direction: LONG or SHORT, by default short when the stop is above the entry and long otherwise,
+        a stop at the entry included
+    :param entryStartRows: first row of every day where the entry may fill, by default the first row of the day,
+        e.g. the first row after the opening range of ``backtest.indicators.OpeningRangeHigh.dayLevels``
+    :return: trade ledger with LEDGER_COLUMNS, one row per day with a filled entry
+    """
+    lows, highs = envelopes(bars)
+    rowDays = dayOfRows(dayIndex)
+    entries = perDay(entry, dayIndex)
+    stops = perDay(stop, dayIndex)
+
+    rowEntries = entries[rowDays]
+    entryMask = (lows <= rowEntries) & (rowEntries <= highs)
+    if entryStartRows is not None:
+        entryMask &= np.arange(len(rowDays)) >= np.asarray(entryStartRows)[rowDays]
+    entryRows = firstRowPerDay(entryMask, dayIndex)
+    traded = entryRows != NO_ROW
+
+    rowStops = stops[rowDays]
+    afterEntry = np.arange(len(rowDays)) > np.where(traded, entryRows, len(rowDays))[rowDays]
+    stopRows = firstRowPerDay(afterEntry & (lows <= rowStops) & (rowStops <= highs), dayIndex)
+    stopHit = stopRows != NO_ROW
+
+    exitRows = np.where(stopHit, stopRows, dayIndex.ends - 1)
+    exitPrices = np.where(stopHit, stops, bars.close[exitRows])
+    if direction is None:
+        directions = np.where(stops > entries, SHORT, LONG)
+    else:
+        directions = np.full(len(dayIndex), direction)
+
+    days = np.flatnonzero(traded)
+    return pd.DataFrame({
+        'Day': [dayIndex.dayAt(position) for position in days],
+        'EntryTime': timesToIndex(np.asarray(bars.times[entryRows[days]])),
+        'EntryPrice': entries[days],
+        'ExitTime': timesToIndex(np.asarray(bars.times[exitRows[days]])),
+        'ExitPrice': exitPrices[days],
+        'StopHit': stopHit[days],
+        'Direction': directions[days],
+        'PnL': directions[days] * (exitPrices[days] - entries[days]),
+    }, columns=LEDGER_COLUMNS)
@@ -0,0 +1,371 @@
+"""
+Bar indicators for chart overlays and entry/stop rules: session VWAP, ATR, rolling highs and lows and opening
+range levels.
+
+Every indicator is computed two ways which give the same values. ``compute`` runs over a whole history with numpy,
+without a python loop over bars. ``update`` takes the bars one by one in O(1) (amortized for the rolling ones),
+for live bars or bars appended to a computed history. Like ``TouchTracker`` a bar may be passed to update again
+while it is still forming, it then replaces the values of its previous pass; its range is assumed to only grow.
+Bars with missing prices are skipped by both: they add nothing to a sum, an average or an extreme.
+"""
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backtest.barcache import BarArrays
+from backtest.dayindex import DayIndex, localDayBounds
+from backtest.engine import dayOfRows
+
+NS_PER_MINUTE = 60 * 10 ** 9
+DEFAULT_ATR_PERIOD = 14
+DEFAULT_ROLLING_WINDOW = 20
+DEFAULT_OPENING_RANGE_MINUTES = 30
+
+
+def sessionEnd(time: int, tz='UTC') -> int:
+    """Nanoseconds of the local midnight after time, the end of its DayIndex day"""
+    return localDayBounds(time, tz)[2]
+
+
+def previousDayValues(values: np.ndarray, dayIndex: DayIndex) -> np.ndarray:
+    """
+    Value of the last bar before every day, known when the day opens, e.g. for stops placed ATR multiples away
+    from the entry. NaN for the first day.
+    """
+    result = np.full(len(dayIndex), np.nan)
+    if len(dayIndex):
+        result[1:] = values[dayIndex.starts[1:] - 1]
+    return result
+
+
+class Indicator(ABC):
+    """One value per bar, see the module documentation"""
+
+    @abstractmethod
+    def reset(self):
+        """Forgets the bars passed to update"""
+
+    @abstractmethod
+    def update(self, row: int, time: int, open: float, high: float, low: float, close: float,
+               volume: float) -> float:
+        """:return: the value of the bar, row is the last row passed or the next one"""
+
+    @abstractmethod
+    def compute(self, bars: BarArrays, dayIndex: DayIndex) -> np.ndarray:
+        """:return: float64 value of every bar"""
+
+    def resume(self, bars: BarArrays, dayIndex: DayIndex, values: np.ndarray):
+        """Prepares update to continue after the last bar of bars, values are what compute returned for them"""
+        self.reset()
+        for row in range(self._replayFrom(bars, dayIndex), len(bars)):
+            self.update(row, int(bars.times[row]), bars.open[row], bars.high[row], bars.low[row], bars.close[row],
+                        bars.volume[row])
+
+    def _replayFrom(self, bars: BarArrays, dayIndex: DayIndex) -> int:
+        """First row the incremental state depends on"""
+        return int(dayIndex.starts[-1]) if len(dayIndex) else 0
+
+
+class SessionVwap(Indicator):
+    """
+    Volume weighted average of the (high + low + close) / 3 prices since the start of the day, a bar with a missing
+    price or volume counts as a bar without volume
+    """
+
+    def __init__(self, tz='UTC'):
+        self.tz = tz
+        self.reset()
+
+    def reset(self):
+        self._row = None
+        self._sessionEnd = None
+        self._priceVolume = 0.0
+        self._volume = 0.0
+        self._barPriceVolume = 0.0
+        self._barVolume = 0.0
+
+    def update(self, row, time, open, high, low, close, volume):
+        if row != self._row:
+            self._row = row
+            if self._sessionEnd is None or time >= self._sessionEnd:
+                self._sessionEnd = sessionEnd(time, self.tz)
+                self._priceVolume = self._volume = 0.0
+            else:
+                self._priceVolume += self._barPriceVolume
+                self._volume += self._barVolume
+        self._barPriceVolume = (high + low + close) / 3 * volume
+        self._barVolume = float(volume)
+        if math.isnan(self._barPriceVolume):
+            self._barPriceVolume = self._barVolume = 0.0
+        volume = self._volume + self._barVolume
+        return (self._priceVolume + self._barPriceVolume) / volume if volume else math.nan
+
+    def compute(self, bars, dayIndex):
+        priceVolume = (bars.high + bars.low + bars.close) / 3 * np.asarray(bars.volume, dtype='float64')
+        missing = np.isnan(priceVolume)
+        priceVolume = np.cumsum(np.where(missing, 0.0, priceVolume))
+        volume = np.cumsum(np.where(missing, 0.0, bars.volume))
+        rowDays = dayOfRows(dayIndex)
+        # running sums restarted at every day start
+        priceVolume -= np.concatenate(([0.0], priceVolume))[dayIndex.starts][rowDays]
+        volume -= np.concatenate(([0.0], volume))[dayIndex.starts][rowDays]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(volume > 0, priceVolume / volume, np.nan)
+
+
+class AverageTrueRange(Indicator):
+    """
+    Wilder's average true range, the first bar's range seeds it. A bar without high or low keeps the previous
+    average, a bar without close is ranged against the last close before it.
+    """
+
+    def __init__(self, period: int = DEFAULT_ATR_PERIOD):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self._row = None
+        self._previousAtr = math.nan
+        self._previousClose = math.nan
+        self._atr = math.nan
+        self._close = math.nan
+
+    def update(self, row, time, open, high, low, close, volume):
+        if row != self._row:
+            self._row = row
+            self._previousAtr, self._previousClose = self._atr, self._close
+        if math.isnan(high) or math.isnan(low):
+            self._atr = self._previousAtr
+        else:
+            if math.isnan(self._previousClose):
+                trueRange = high - low
+            else:
+                trueRange = max(high, self._previousClose) - min(low, self._previousClose)
+            if math.isnan(self._previousAtr):
+                self._atr = float(trueRange)
+            else:
+                self._atr = self._previousAtr + (trueRange - self._previousAtr) / self.period
+        self._close = self._previousClose if math.isnan(close) else close
+        return self._atr
+
+    def compute(self, bars, dayIndex):
+        previousClose = pd.Series(bars.close, dtype='float64').ffill().shift().values
+        trueRange = np.fmax(bars.high, previousClose) - np.fmin(bars.low, previousClose)
+        trueRange[np.isnan(bars.high) | np.isnan(bars.low)] = np.nan
+        return pd.Series(trueRange).ewm(alpha=1 / self.period, adjust=False, ignore_na=True).mean().values
+
+    def resume(self, bars, dayIndex, values):
+        # the average carries the whole history, it is seeded from the last two values instead of a replay
+        self.reset()
+        if len(bars) > 1:
+            self._row = len(bars) - 2
+            self._atr = float(values[-2])
+            closes = np.flatnonzero(~np.isnan(bars.close[:-1]))
+            self._close = float(bars.close[closes[-1]]) if len(closes) else math.nan
+        if len(bars):
+            self.update(len(bars) - 1, int(bars.times[-1]), bars.open[-1], bars.high[-1], bars.low[-1],
+                        bars.close[-1], bars.volume[-1])
+
+
+class _RollingExtreme(Indicator):
+    """Extreme of the last window bars, kept in a monotonic queue of (row, value), NaN when they have no price"""
+    column = None
+    function = None
+
+    def __init__(self, window: int = DEFAULT_ROLLING_WINDOW):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._queue = deque()
+
+    @abstractmethod
+    def _value(self, high: float, low: float) -> float:
+        """The price of a bar the extreme is taken of, the one of column"""
+
+    @abstractmethod
+    def _dominates(self, kept: float, value: float) -> bool:
+        """Whether a queued value stays the extreme over a newer one"""
+
+    def update(self, row, time, open, high, low, close, volume):
+        value = self._value(high, low)
+        # a forming bar passed again only extends its range, so whatever it pushed out stays out
+        while self._queue and self._queue[-1][0] == row:
+            self._queue.pop()
+        if not math.isnan(value):
+            while self._queue and not self._dominates(self._queue[-1][1], value):
+                self._queue.pop()
+            self._queue.append((row, value))
+        while self._queue and self._queue[0][0] <= row - self.window:
+            self._queue.popleft()
+        return float(self._queue[0][1]) if self._queue else math.nan
+
+    def compute(self, bars, dayIndex):
+        rolling = pd.Series(bars.column(self.column), dtype='float64').rolling(self.window, min_periods=1)
+        return getattr(rolling, self.function)().values
+
+    def _replayFrom(self, bars, dayIndex):
+        return max(len(bars) - self.window, 0)
+
+
+class RollingHigh(_RollingExtreme):
+    column = 'High'
+    function = 'max'
+
+    def _value(self, high, low):
+        return high
+
+    def _dominates(self, kept, value):
+        return kept > value
+
+
+class RollingLow(_RollingExtreme):
+    column = 'Low'
+    function = 'min'
+
+    def _value(self, high, low):
+        return low
+
+    def _dominates(self, kept, value):
+        return kept < value
+
+
+class _OpeningRange(Indicator):
+    """
+    Extreme of the bars starting in the first minutes of the day. It is NaN on the bars of the range and constant
+    from the first bar after it, so an entry on it never fills on the bars which made it.
+    """
+    column = None
+
+    def __init__(self, minutes: int = DEFAULT_OPENING_RANGE_MINUTES, tz='UTC'):
+        self.minutes = minutes
+        self.tz = tz
+        self.reset()
+
+    def reset(self):
+        self._row = None
+        self._sessionEnd = None
+        self._rangeEnd = None
+        self._level = math.nan
+        self._barLevel = math.nan
+
+    @abstractmethod
+    def _value(self, high: float, low: float) -> float:
+        """The price of a bar the range level is taken of, the one of column"""
+
+    @abstractmethod
+    def _extreme(self, a: float, b: float) -> float:
+        """The more extreme of two levels, a NaN is no level"""
+
+    def update(self, row, time, open, high, low, close, volume):
+        if row != self._row:
+            self._row = row
+            if self._sessionEnd is None or time >= self._sessionEnd:
+                self._sessionEnd = sessionEnd(time, self.tz)
+                self._rangeEnd = time + self.minutes * NS_PER_MINUTE
+                self._level = self._barLevel = math.nan
+            self._level = self._extreme(self._level, self._barLevel)
+        if time >= self._rangeEnd:
+            self._barLevel = math.nan
+            return float(self._level)
+        self._barLevel = self._value(high, low)
+        return math.nan
+
+    def compute(self, bars, dayIndex):
+        levels, readyRows = self.dayLevels(bars, dayIndex)
+        rowDays = dayOfRows(dayIndex)
+        return np.where(np.arange(len(bars)) >= readyRows[rowDays], levels[rowDays], np.nan)
+
+    def dayLevels(self, bars: BarArrays, dayIndex: DayIndex) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rule inputs: the level of every day and the first row after its range, see ``engine.runEntryStop``
+        entryStartRows. A day without bars after the range has the level but its end row.
+        """
+        if len(bars) == 0:
+            return np.empty(0), np.empty(0, dtype='int64')
+        rowDays = dayOfRows(dayIndex)
+        times = np.asarray(bars.times)
+        inRange = times < times[dayIndex.starts][rowDays] + self.minutes * NS_PER_MINUTE
+        values = np.where(inRange, bars.column(self.column), np.nan)
+        levels = self._reduce(values, dayIndex.starts)
+        readyRows = dayIndex.starts + np.add.reduceat(inRange, dayIndex.starts)
+        return levels, readyRows
+
+    @abstractmethod
+    def _reduce(self, values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        """Level of every day from the values of its range bars, NaN elsewhere"""
+
+
+class OpeningRangeHigh(_OpeningRange):
+    column = 'High'
+
+    def _value(self, high, low):
+        return high
+
+    def _extreme(self, a, b):
+        return a if b <= a or math.isnan(b) else b
+
+    def _reduce(self, values, starts):
+        return np.fmax.reduceat(values, starts)
+
+
+class OpeningRangeLow(_OpeningRange):
+    column = 'Low'
+
+    def _value(self, high, low):
+        return low
+
+    def _extreme(self, a, b):
+        return a if b >= a or math.isnan(b) else b
+
+    def _reduce(self, values, starts):
+        return np.fmin.reduceat(values, starts)
+
+
+def defaultIndicators(tz='UTC') -> Dict[str, Indicator]:
+    return {
+        'VWAP': SessionVwap(tz),
+        'ATR': AverageTrueRange(),
+        'RollingHigh': RollingHigh(),
+        'RollingLow': RollingLow(),
+        'OpeningRangeHigh': OpeningRangeHigh(tz=tz),
+        'OpeningRangeLow': OpeningRangeLow(tz=tz),
+    }
+
+
+class IndicatorEngine:
+    """
+    Named indicators computed together: compute() over a history, then update() for every bar appended to it.
+    Session indicators split days in the timezone they were created with, the same one as the DayIndex passed.
+    """
+
+    def __init__(self, indicators: Dict[str, Indicator] = None, tz='UTC'):
+        self.tz = tz
+        self.indicators = indicators if indicators is not None else defaultIndicators(tz)
+        self.values = {name: math.nan for name in self.indicators}
+
+    @property
+    def names(self):
+        return list(self.indicators)
+
+    def compute(self, bars: BarArrays, dayIndex: Optional[DayIndex] = None) -> Dict[str, np.ndarray]:
+        """:return: name -> value of every bar, update continues after the last bar"""
+        dayIndex = DayIndex(bars.times, self.tz) if dayIndex is None else dayIndex
+        result = {}
+        for name, indicator in self.indicators.items():
+            values = indicator.compute(bars, dayIndex)
+            indicator.resume(bars, dayIndex, values)
+            result[name] = values
+            self.values[name] = float(values[-1]) if len(values) else math.nan
+        return result
+
+    def update(self, row: int, time: int, open: float, high: float, low: float, close: float,
+               volume: float) -> Dict[str, float]:
+        """:return: name -> value of the bar, row is the last row passed or the next one"""
+        for name, indicator in self.indicators.items():
+            self.values[name] = indicator.update(row, time, open, high, low, close, volume)
+        return dict(self.values)
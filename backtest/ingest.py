@@ -0,0 +1,138 @@
+"""
+Csv ingestion shared by every OHLCV loader.
+
+Files written by the downloader have fixed width timestamps like ``2019-01-02 09:30:00-05:00``.
+Letting pandas infer them goes row by row because the offset changes with the daylight saving time,
+here the local part is parsed by numpy in one pass and the few distinct offsets are subtracted afterwards.
+Anything else falls back to the generic pandas parser.
+When pyarrow is installed its multithreaded csv reader is used instead of pandas.read_csv.
+"""
+import csv
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    from pyarrow import csv as arrowCsv
+except ImportError:
+    pyarrow = None
+    arrowCsv = None
+
+TIME_COLUMN = 'DateTime'
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+COLUMNS = PRICE_COLUMNS + ['Volume']
+NA_VALUES = ['nan']
+
+PANDAS_ENGINE = 'pandas'
+ARROW_ENGINE = 'pyarrow'
+DEFAULT_ENGINE = ARROW_ENGINE if pyarrow is not None else PANDAS_ENGINE
+
+LOCAL_WIDTH = len('2019-01-02 09:30:00')
+OFFSET_WIDTH = len('-05:00')
+NS_PER_MINUTE = 60 * 10 ** 9
+
+
+def priceDtype(float32: bool = False):
+    return np.float32 if float32 else np.float64
+
+
+def validateHeader(filename: str, columns=None):
+    """Raises ValueError when the header of filename misses one of the columns"""
+    columns = [TIME_COLUMN] + COLUMNS if columns is None else columns
+    with open(filename, newline='') as f:
+        header = next(csv.reader(f), [])
+    missing = [name for name in columns if name not in header]
+    if missing:
+        raise ValueError(f"{filename} has no {', '.join(missing)} column(s), found {', '.join(header)}")
+
+
+def parseTimes(texts) -> np.ndarray:
+    """Timestamps with a utc offset as int64 nanoseconds since epoch (UTC)"""
+    values = np.asarray(texts)
+    if len(values) == 0:
+        return np.empty(0, dtype='int64')
+    try:
+        return _parseFixedWidth(values)
+    except ValueError:
+        return pd.to_datetime(pd.Series(values), utc=True).values.astype('datetime64[ns]').view('int64')
+
+
+def _parseFixedWidth(values: np.ndarray) -> np.ndarray:
+    width = LOCAL_WIDTH + OFFSET_WIDTH
+    data = values.astype(f'S{width + 1}')
+    if data.dtype.itemsize != width + 1:
+        raise ValueError("Unexpected timestamp width")
+    chars = data.view('S1').reshape(-1, width + 1)
+    # shorter or longer texts leave a zero byte or a character in the extra column
+    if (chars[:, width] != b'').any() or (chars[:, width - 1] == b'').any() \
+            or ~np.isin(chars[:, LOCAL_WIDTH], [b'+', b'-']).all() or (chars[:, LOCAL_WIDTH + 3] != b':').any():
+        raise ValueError("Timestamps are not in the fixed width format")
+    local = np.ascontiguousarray(chars[:, :LOCAL_WIDTH]).view(f'S{LOCAL_WIDTH}').ravel() \
+        .astype('datetime64[ns]').view('int64')
+    offsets, inverse = np.unique(np.ascontiguousarray(chars[:, LOCAL_WIDTH:width]).view(f'S{OFFSET_WIDTH}').ravel(),
+                                 return_inverse=True)
+    return local - np.array([_offsetNs(offset.decode('ascii')) for offset in offsets], dtype='int64')[inverse]
+
+
+def _offsetNs(offset: str) -> int:
+    sign = -1 if offset[0] == '-' else 1
+    return sign * (int(offset[1:3]) * 60 + int(offset[4:6])) * NS_PER_MINUTE
+
+
+def readColumns(filename: str, float32: bool = False, engine: str = None) -> Dict[str, np.ndarray]:
+    """
+    Reads DateTime and OHLCV columns of a csv file as numpy arrays, DateTime as int64 nanoseconds (UTC),
+    prices as float64 or float32 and Volume with the dtype it is parsed with
+    """
+    validateHeader(filename)
+    engine = engine or DEFAULT_ENGINE
+    if engine == ARROW_ENGINE:
+        return _readArrow(filename, float32)
+    if engine != PANDAS_ENGINE:
+        raise ValueError(f"Unknown csv engine {engine}")
+
+    prices = priceDtype(float32)
+    df = pd.read_csv(filename, usecols=[TIME_COLUMN] + COLUMNS, na_values=NA_VALUES,
+                     dtype={TIME_COLUMN: str, **{name: prices for name in PRICE_COLUMNS}})
+    columns = {TIME_COLUMN: parseTimes(df[TIME_COLUMN].values)}
+    for name in COLUMNS:
+        columns[name] = np.ascontiguousarray(df[name].values)
+    return columns
+
+
+def _readArrow(filename: str, float32: bool) -> Dict[str, np.ndarray]:
+    if arrowCsv is None:
+        raise ValueError("The pyarrow csv engine is not installed")
+    prices = pyarrow.float32() if float32 else pyarrow.float64()
+    columnTypes = {name: prices for name in PRICE_COLUMNS}
+    try:
+        table = _readArrowTable(filename, {TIME_COLUMN: pyarrow.timestamp('ns', tz='UTC'), **columnTypes})
+        times = table.column(TIME_COLUMN).to_numpy().astype('datetime64[ns]').view('int64')
+    except pyarrow.ArrowInvalid:
+        # timestamps arrow can't parse on its own
+        table = _readArrowTable(filename, {TIME_COLUMN: pyarrow.string(), **columnTypes})
+        times = parseTimes(table.column(TIME_COLUMN).to_numpy(zero_copy_only=False))
+    columns = {TIME_COLUMN: np.ascontiguousarray(times)}
+    for name in COLUMNS:
+        columns[name] = np.ascontiguousarray(table.column(name).to_numpy(zero_copy_only=False))
+    return columns
+
+
+def _readArrowTable(filename: str, columnTypes: dict):
+    options = arrowCsv.ConvertOptions(include_columns=[TIME_COLUMN] + COLUMNS, column_types=columnTypes,
+                                      null_values=NA_VALUES + [''])
+    return arrowCsv.read_csv(filename, convert_options=options)
+
+
+def iterChunks(filename: str, chunkRows: int, float32: bool = False) -> Iterator[Tuple[np.ndarray, pd.DataFrame]]:
+    """
+    Yields (times, frame) per chunk of at most chunkRows rows. times are int64 nanoseconds (UTC) and
+    the frame keeps the DateTime text as it is in the file.
+    """
+    validateHeader(filename)
+    prices = priceDtype(float32)
+    for df in pd.read_csv(filename, usecols=[TIME_COLUMN] + COLUMNS, na_values=NA_VALUES, chunksize=chunkRows,
+                          dtype={TIME_COLUMN: str, **{name: prices for name in PRICE_COLUMNS}}):
+        yield parseTimes(df[TIME_COLUMN].values), df
@@ -0,0 +1,148 @@
+"""
+Streaming k-way merge of time sorted bar csv files.
+
+Every input is read in chunks and the rows are merged with a heap, so time is linear in the number of rows and
+memory is bounded by one chunk per input. Rows with the same timestamp are deduplicated by a conflict policy.
+"""
+import csv
+import heapq
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Sequence, Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest import barcache, ingest
+from backtest.dayindex import localDayBounds
+
+PREFER_FIRST = 'first'
+PREFER_LAST = 'last'
+PREFER_NEWEST = 'newest'
+POLICIES = [PREFER_FIRST, PREFER_LAST, PREFER_NEWEST]
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+class DayCoverage:
+    """
+    Per day count of non empty values of every column, same numbers as groupby(index.date).count() of an index
+    converted to tz. Days are ISO date strings.
+    """
+
+    def __init__(self, columns: Sequence[str], tz='UTC'):
+        self.columns = list(columns)
+        self.tz = tz
+        self.counts = OrderedDict()
+        # rows come in time order, the bounds of the current day save a timezone conversion per row
+        self._day = None
+        self._dayStart = self._dayEnd = 0
+
+    def add(self, time: int, values):
+        """:param time: nanoseconds since epoch (UTC) of the row"""
+        if self._day is None or not self._dayStart <= time < self._dayEnd:
+            day, self._dayStart, self._dayEnd = localDayBounds(time, self.tz)
+            self._day = day.isoformat()
+        counts = self.counts.get(self._day)
+        if counts is None:
+            counts = self.counts[self._day] = [0] * len(self.columns)
+        for position, value in enumerate(values):
+            if value == value and value is not None:
+                counts[position] += 1
+
+    def toFrame(self) -> pd.DataFrame:
+        return pd.DataFrame.from_dict(self.counts, orient='index', columns=self.columns)
+
+    def days(self) -> pd.Series:
+        """Bars per day, indexed by day"""
+        return pd.Series([counts[0] for counts in self.counts.values()], index=pd.to_datetime(list(self.counts)))
+
+
+def filePriorities(filenames: Sequence[str], policy: str):
+    """Lower priority wins a timestamp conflict"""
+    if policy == PREFER_FIRST:
+        return list(range(len(filenames)))
+    if policy == PREFER_LAST:
+        return [-position for position in range(len(filenames))]
+    if policy == PREFER_NEWEST:
+        return [-os.stat(filename).st_mtime_ns for filename in filenames]
+    raise ValueError(f"Unknown conflict policy {policy}, expected one of {POLICIES}")
+
+
+def offsetSuffix(offsetNs: int) -> str:
+    """'-05:00' style suffix of a UTC offset, as pandas writes it"""
+    minutes = abs(int(offsetNs)) // 60_000_000_000
+    return f"{'-' if offsetNs < 0 else '+'}{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def localTexts(keys: np.ndarray, texts: pd.Series, tz: str) -> list:
+    """
+    DateTime texts of keys in tz. A text whose offset already is the offset of tz at that time is kept as it is,
+    formatting timestamps costs more than parsing them, so only rows from another timezone are formatted.
+    """
+    index = barcache.timesToIndex(keys, tz)
+    offsets = index.tz_localize(None).asi8 - keys
+    uniqueOffsets, inverse = np.unique(offsets, return_inverse=True)
+    suffixes = np.array([offsetSuffix(offset) for offset in uniqueOffsets], dtype=object)[inverse]
+    texts = texts.to_numpy(dtype=object)
+    stale = pd.Series(texts, dtype=str).str[-6:].to_numpy(dtype=object) != suffixes
+    if stale.any():
+        texts[stale] = index[stale].astype(str)
+    return texts.tolist()
+
+
+def iterRows(filename: str, priority, chunkRows=DEFAULT_CHUNK_ROWS, tz='US/Eastern'):
+    """
+    Yields (timestamp ns, priority, DateTime text in tz, Open, High, Low, Close, Volume) tuples.
+    """
+    lastKey = None
+    for keys, chunk in ingest.iterChunks(filename, chunkRows):
+        if len(keys) and ((lastKey is not None and keys[0] < lastKey) or (keys[1:] < keys[:-1]).any()):
+            raise ValueError(f"{filename} is not sorted by DateTime")
+        if len(keys):
+            lastKey = keys[-1]
+        texts = localTexts(keys, chunk[barcache.TIME_COLUMN], tz)
+        columns = [chunk[name].tolist() for name in barcache.COLUMNS]
+        yield from zip(keys.tolist(), [priority] * len(keys), texts, *columns)
+
+
+def mergeFiles(filenames: Sequence[str], output: str, policy=PREFER_LAST, coverage: Optional[DayCoverage] = None,
+               constantColumns: dict = None, chunkRows=DEFAULT_CHUNK_ROWS, tz='US/Eastern') -> int:
+    """
+    Merges time sorted csv files into output, one row per timestamp, with timestamps written in tz.
+    output is replaced only once the merge is complete.
+
+    :param policy: which file wins when several have the same timestamp, one of POLICIES
+    :param coverage: optional DayCoverage filled with the merged rows in the same pass
+    :param constantColumns: extra columns written with the same value on every row
+    :return: number of merged rows
+    """
+    constantColumns = constantColumns or {}
+    streams = [iterRows(filename, priority, chunkRows, tz)
+               for filename, priority in zip(filenames, filePriorities(filenames, policy))]
+    rows = 0
+    lastKey = None
+    directory, name = os.path.split(os.path.abspath(output))
+    handle, tmpOutput = tempfile.mkstemp(prefix=f'{name}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(handle, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([barcache.TIME_COLUMN] + barcache.COLUMNS + list(constantColumns))
+            constants = list(constantColumns.values())
+            for row in heapq.merge(*streams):
+                if row[0] == lastKey:
+                    continue
+                lastKey = row[0]
+                values = row[3:]
+                writer.writerow((row[2],) + values + tuple(constants))
+                if coverage is not None:
+                    coverage.add(row[0], values + tuple(constants))
+                rows += 1
+        # mkstemp creates the file readable by the owner only
+        os.chmod(tmpOutput, os.stat(output).st_mode if os.path.exists(output) else 0o644)
+        os.replace(tmpOutput, output)
+    except BaseException:
+        if os.path.exists(tmpOutput):
+            os.remove(tmpOutput)
+        raise
+    return rows
@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from backtest.barcache import TIME_COLUMN, frameTimes
+from backtest.resample import resampleBars
+
+RAW_LEVEL = 'raw'
+DEFAULT_RULES = ['5min', '15min', '30min', '1h', '1D']
+DEFAULT_MAX_BARS = 1500
+
+
+@dataclass
+class PyramidLevel:
+    rule: str
+    quotes: pd.DataFrame
+    times: np.ndarray
+
+    def rowRange(self, start: int, end: int):
+        """[from, to) rows of the bars starting in [start, end), both int64 nanoseconds"""
+        return self.times.searchsorted(start, side='left'), self.times.searchsorted(end, side='left')
+
+    def barCount(self, start: int, end: int) -> int:
+        fromRow, toRow = self.rowRange(start, end)
+        return toRow - fromRow
+
+    def slice(self, start: int, end: int) -> pd.DataFrame:
+        fromRow, toRow = self.rowRange(start, end)
+        return self.quotes.iloc[fromRow:toRow].reset_index(drop=True)
+
+
+class BarPyramid:
+    """
+    Raw bars plus the same bars aggregated to coarser timeframes, built once per file with the resampler
+    aggregation. Levels which would not reduce the bar count (e.g. 5min over 30min bars) are skipped.
+    """
+
+    def __init__(self, df: pd.DataFrame, rules=DEFAULT_RULES):
+        self.levels: List[PyramidLevel] = [PyramidLevel(RAW_LEVEL, df, frameTimes(df))]
+        indexed = df.set_index(TIME_COLUMN)
+        for rule in rules:
+            quotes = resampleBars(indexed, rule).reset_index()
+            if len(quotes) < len(self.levels[-1].quotes):
+                self.levels.append(PyramidLevel(rule, quotes, frameTimes(quotes)))
+
+    def levelFor(self, start: int, end: int, maxBars: int = DEFAULT_MAX_BARS) -> PyramidLevel:
+        """Finest level showing at most maxBars bars between start and end, the coarsest one otherwise"""
+        for level in self.levels:
+            if level.barCount(start, end) <= maxBars:
+                return level
+        return self.levels[-1]
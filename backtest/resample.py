@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+OHLCV_AGGREGATION = OrderedDict([
+    ('Open', 'first'),
+    ('High', 'max'),
+    ('Low', 'min'),
+    ('Close', 'last'),
+    ('Volume', 'sum'),
+])
+
+
+def resampleBars(df: pd.DataFrame, rule: str, origin='start_day') -> pd.DataFrame:
+    """Resamples a DateTime indexed OHLCV frame, bins without bars are dropped"""
+    return aggregate(df, rule, origin).dropna()
+
+
+def aggregate(df: pd.DataFrame, rule: str, origin='start_day') -> pd.DataFrame:
+    aggregation = OrderedDict((name, OHLCV_AGGREGATION[name]) for name in df.columns if name in OHLCV_AGGREGATION)
+    if not isinstance(pd.tseries.frequencies.to_offset(rule), pd.offsets.Tick):
+        # calendar rules like weeks or months are anchored by themselves
+        return df.resample(rule).agg(aggregation)
+    return df.resample(rule, origin=origin).agg(aggregation)
+
+
+def resampleChunks(frames: Iterable[pd.DataFrame], rule: str) -> Iterator[pd.DataFrame]:
+    """
+    Resamples time ordered DateTime indexed OHLCV chunks with the result of resampleBars over their concatenation.
+    The last bin of a chunk may continue in the next one, so it is held back and merged with the first bin of the
+    next chunk using the same aggregation. Yields resampled frames, memory is bounded by the chunk size.
+    """
+    origin = None
+    carry = None
+    for frame in frames:
+        if frame.empty:
+            continue
+        if origin is None:
+            # bins are anchored to the first day of the whole input like resampleBars does
+            origin = frame.index[0].normalize()
+        bins = aggregate(frame, rule, origin)
+        if carry is not None:
+            if bins.index[0] == carry.index[0]:
+                head = pd.concat([carry, bins.iloc[:1]])
+                head = head.groupby(level=0).agg(OrderedDict((name, OHLCV_AGGREGATION[name]) for name in head.columns))
+                bins = pd.concat([head, bins.iloc[1:]])
+            else:
+                yield carry.dropna()
+        carry = bins.iloc[-1:]
+        yield bins.iloc[:-1].dropna()
+    if carry is not None:
+        yield carry.dropna()
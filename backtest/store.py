@@ -0,0 +1,110 @@
+"""
+Local bar store: one csv per ticker and bar size, e.g. ``store/amd_1_min.csv``.
+
+Besides the bars the store remembers which past days have already been requested from the broker, so that
+holidays and other days without a session are not requested again on every refresh.
+"""
+import datetime
+import json
+import os
+import tempfile
+from typing import List, Tuple, Set
+
+import numpy as np
+import pandas as pd
+
+from backtest import barcache
+from backtest.dayindex import DayIndex
+from backtest.merge import mergeFiles, PREFER_LAST
+
+STORE_TZ = 'US/Eastern'
+CHECKED_SUFFIX = '.checked.json'
+
+
+class BarStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, ticker: str, barSize: str) -> str:
+        return os.path.join(self.directory, f'{ticker.lower()}_{barSize.replace(" ", "_")}.csv')
+
+    def load(self, ticker: str, barSize: str) -> pd.DataFrame:
+        path = self.path(ticker, barSize)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=[barcache.TIME_COLUMN] + barcache.COLUMNS)
+        return barcache.loadFrame(path, tz=STORE_TZ)
+
+    def sessions(self, ticker: str, barSize: str) -> Set[datetime.date]:
+        path = self.path(ticker, barSize)
+        if not os.path.exists(path):
+            return set()
+        dayIndex = DayIndex(barcache.loadBars(path).times, STORE_TZ)
+        return {dayIndex.dayAt(position) for position in range(len(dayIndex))}
+
+    def checkedDays(self, ticker: str, barSize: str) -> Set[datetime.date]:
+        try:
+            with open(self.path(ticker, barSize) + CHECKED_SUFFIX) as f:
+                return {datetime.date.fromisoformat(day) for day in json.load(f)}
+        except (OSError, ValueError):
+            return set()
+
+    def markChecked(self, ticker: str, barSize: str, days):
+        checked = self.checkedDays(ticker, barSize) | set(days)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(ticker, barSize) + CHECKED_SUFFIX, 'w') as f:
+            json.dump(sorted(day.isoformat() for day in checked), f)
+
+    def missingRanges(self, ticker: str, barSize: str, fromDate: datetime.date, endDate: datetime.date,
+                      today: datetime.date = None) -> List[Tuple[datetime.date, datetime.date]]:
+        """
+        Returns [from, end) ranges of weekdays in [fromDate, endDate) which have no bars and have not been
+        requested before. Today is always missing as its session may not be complete yet.
+        """
+        today = datetime.date.today() if today is None else today
+        known = self.sessions(ticker, barSize) | self.checkedDays(ticker, barSize)
+        weekdays = pd.bdate_range(fromDate, endDate - datetime.timedelta(days=1)).date
+        missing = [day for day in weekdays if day >= today or day not in known]
+        return groupRanges(missing, weekdays)
+
+    def mergeFile(self, ticker: str, barSize: str, fileName: str) -> int:
+        """
+        Merges a time sorted bar csv in STORE_TZ into the store with a streaming merge, its bars win over stored
+        ones. Memory is bounded by the merge chunks whatever the store size. Returns the number of bars in the store.
+        """
+        path = self.path(ticker, barSize)
+        os.makedirs(self.directory, exist_ok=True)
+        inputs = [path, fileName] if os.path.exists(path) else [fileName]
+        return mergeFiles(inputs, path, PREFER_LAST, tz=STORE_TZ)
+
+    def merge(self, ticker: str, barSize: str, bars: pd.DataFrame) -> int:
+        """
+        Merges bars with DateTime and OHLCV columns into the store, new bars win over stored ones with the same
+        timestamp. Returns the number of bars in the store.
+        """
+        bars = bars[[barcache.TIME_COLUMN] + barcache.COLUMNS].copy()
+        bars[barcache.TIME_COLUMN] = pd.to_datetime(bars[barcache.TIME_COLUMN], utc=True).dt.tz_convert(STORE_TZ)
+        bars = bars.drop_duplicates(subset=barcache.TIME_COLUMN, keep='last') \
+            .sort_values(barcache.TIME_COLUMN, kind='stable')
+        os.makedirs(self.directory, exist_ok=True)
+        handle, fileName = tempfile.mkstemp(suffix='.csv', dir=self.directory)
+        os.close(handle)
+        try:
+            bars.to_csv(fileName, index=False)
+            return self.mergeFile(ticker, barSize, fileName)
+        finally:
+            os.remove(fileName)
+
+
+def groupRanges(days, calendar) -> List[Tuple[datetime.date, datetime.date]]:
+    """Groups days which are consecutive within calendar into [from, end) ranges."""
+    positions = np.searchsorted(np.asarray(calendar, dtype='datetime64[D]'),
+                                np.asarray(days, dtype='datetime64[D]'))
+    ranges = []
+    lastPosition = None
+    for position, day in zip(positions, days):
+        if ranges and position == lastPosition + 1:
+            ranges[-1] = (ranges[-1][0], day + datetime.timedelta(days=1))
+        else:
+            ranges.append((day, day + datetime.timedelta(days=1)))
+        lastPosition = position
+    return ranges
@@ -0,0 +1,120 @@
+"""
+Entry/stop parameter sweep over many symbol files, sharded across a process pool.
+
+Entries are placed at ``day open + entry offset`` and stops at ``entry - stop distance`` (a negative distance
+makes a short trade), with the semantics of ``backtest.engine.runEntryStop``. The entry bars are searched once per
+offset and the stop bars once per distance with a per day ``FirstTouchIndex``, which costs O(days log m) per grid
+point, m being the bars of a day, instead of a pass over every bar. Workers get file names only: bars are read from the memory-mapped cache of
+``backtest.barcache``, so every process shares the same pages through the OS page cache and nothing
+but parameters and summary rows is pickled. The touch index is built by every task and freed with it.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from backtest.barcache import loadBars
+from backtest.engine import loadDays, dayOpens, LONG, SHORT
+from backtest.touch import FirstTouchIndex, NO_TOUCH
+
+SUMMARY_COLUMNS = ['Symbol', 'EntryOffset', 'StopDistance', 'Days', 'Trades', 'HitRate', 'StopRate', 'WinRate',
+                   'TotalPnL', 'MeanPnL']
+DEFAULT_OFFSETS_PER_TASK = 16
+
+
+def symbolName(filename: str) -> str:
+    return os.path.basename(filename).split(".")[0]
+
+
+@lru_cache(maxsize=2)
+def _prepareFile(filename: str, tz: str):
+    bars, dayIndex = loadDays(filename, tz)
+    return bars, dayIndex, dayOpens(bars, dayIndex), bars.close[dayIndex.ends - 1]
+
+
+def _buildCache(filename: str):
+    loadBars(filename)
+    return filename
+
+
+def summarize(ledger: pd.DataFrame, days: int) -> dict:
+    return summarizeTrades(ledger['PnL'].values, ledger['StopHit'].values, days)
+
+
+def summarizeTrades(pnl: np.ndarray, stopHit: np.ndarray, days: int) -> dict:
+    trades = len(pnl)
+    return {
+        'Days': days,
+        'Trades': trades,
+        'HitRate': trades / days if days else np.nan,
+        'StopRate': stopHit.mean() if trades else np.nan,
+        'WinRate': (pnl > 0).mean() if trades else np.nan,
+        'TotalPnL': pnl.sum(),
+        'MeanPnL': pnl.mean() if trades else np.nan,
+    }
+
+
+def sweepFile(filename: str, entryOffsets: Sequence[float], stopDistances: Sequence[float], tz='UTC') -> list:
+    bars, dayIndex, opens, lastCloses = _prepareFile(filename, tz)
+    # the index is private memory of the worker, unlike the mapped bars, so it only lives for the task
+    touchIndex = FirstTouchIndex(bars.open, bars.high, bars.low, bars.close, dayIndex.starts)
+    symbol = symbolName(filename)
+    rows = []
+    for offset in entryOffsets:
+        entries = opens + offset
+        entryRows = touchIndex.firstTouches(entries, dayIndex.starts, dayIndex.ends)
+        days = np.flatnonzero(entryRows != NO_TOUCH)
+        entries, entryRows = entries[days], entryRows[days]
+        for distance in stopDistances:
+            stops = entries - distance
+            stopHit = touchIndex.firstTouches(stops, entryRows + 1, dayIndex.ends[days]) != NO_TOUCH
+            exitPrices = np.where(stopHit, stops, lastCloses[days])
+            directions = np.where(stops > entries, SHORT, LONG)
+            row = {'Symbol': symbol, 'EntryOffset': offset, 'StopDistance': distance}
+            row.update(summarizeTrades(directions * (exitPrices - entries), stopHit, len(dayIndex)))
+            rows.append(row)
+    return rows
+
+
+def _sweepTask(task):
+    return sweepFile(*task)
+
+
+def runSweep(filenames: Sequence[str], entryOffsets: Sequence[float], stopDistances: Sequence[float], tz='UTC',
+             processes=None, offsetsPerTask=DEFAULT_OFFSETS_PER_TASK) -> pd.DataFrame:
+    """
+    Sweeps the entry offset x stop distance grid over every file
+
+    :param processes: pool size, all cores by default
+    :param offsetsPerTask: how many entry offsets one task covers, smaller values balance the load better
+    :return: one summary row per symbol and grid point, see SUMMARY_COLUMNS
+    """
+    entryOffsets = list(entryOffsets)
+    stopDistances = list(stopDistances)
+    tasks = [(filename, entryOffsets[i:i + offsetsPerTask], stopDistances, tz)
+             for filename in filenames
+             for i in range(0, len(entryOffsets), offsetsPerTask)]
+    rows = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        # caches are built up front, in parallel, so that tasks of one file do not all parse the same csv
+        list(pool.map(_buildCache, filenames))
+        for taskRows in pool.map(_sweepTask, tasks):
+            rows += taskRows
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+
+def combineSymbols(summary: pd.DataFrame) -> pd.DataFrame:
+    """Aggregates a runSweep table over symbols, one row per grid point."""
+    grouped = summary.assign(
+        Stops=summary['StopRate'].fillna(0) * summary['Trades'],
+        Wins=summary['WinRate'].fillna(0) * summary['Trades'],
+    ).groupby(['EntryOffset', 'StopDistance'])
+    total = grouped[['Days', 'Trades', 'Stops', 'Wins', 'TotalPnL']].sum()
+    total['HitRate'] = total['Trades'] / total['Days']
+    total['StopRate'] = total['Stops'] / total['Trades']
+    total['WinRate'] = total['Wins'] / total['Trades']
+    total['MeanPnL'] = total['TotalPnL'] / total['Trades']
+    return total.reset_index()[SUMMARY_COLUMNS[1:]]
@@ -0,0 +1,134 @@
+from typing import Optional
+
+import numpy as np
+
+NO_TOUCH = -1
+
+
+def touchEnvelopes(open, high, low, close):
+    """
+    Lowest and highest price of every bar, missing prices are skipped. A bar without both open and close gets an
+    empty range (+inf, -inf) so no price ever falls in it: every span ``EntryStopLine._ochlIntersectionMask``
+    checks has the open or the close at one end.
+    """
+    lows = np.fmin(np.fmin(np.asarray(low, dtype='float64'), open), close)
+    highs = np.fmax(np.fmax(np.asarray(high, dtype='float64'), open), close)
+    empty = np.isnan(lows) | (np.isnan(open) & np.isnan(close))
+    lows[empty] = np.inf
+    highs[empty] = -np.inf
+    return lows, highs
+
+
+class FirstTouchIndex:
+    """
+    Answers "first bar at or after row ``start`` of its day whose range contains price P".
+
+    A bar touches P when P lies between the lowest and the highest of its open, close, high and low,
+    which is what ``EntryStopLine._ochlIntersectionMask`` checks for any well-formed bar, see touchEnvelopes
+    for bars with missing prices.
+    The index keeps sparse tables of the high and low envelopes of every day: level k holds the max high and
+    the min low of every window of 2**k bars, so the first bar reaching up (or down) to P can be
+    found by skipping whole windows that stay below (or above) it in O(log m), m being the bars of the day.
+    Windows never cross a day, so the tables are log2(m) levels deep, not log2(n), and a search never
+    leaves the day of its start. A search round costs O(log m), on gapping bars a price may take a round
+    per gap, O(m) rounds at worst.
+    """
+
+    def __init__(self, open: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray, starts=None):
+        """:param starts: sorted first rows of the days, e.g. DayIndex.starts, by default all bars are one day"""
+        lows, highs = touchEnvelopes(open, high, low, close)
+        self._size = len(highs)
+        self._starts = np.asarray([0] if starts is None or len(starts) == 0 else starts, dtype='int64')
+        self._dayEnds = np.append(self._starts[1:], self._size)
+        longestDay = int((self._dayEnds - self._starts).max()) if self._size else 0
+        self._lows = [lows]
+        self._highs = [highs]
+        width = 1
+        while 2 * width <= longestDay:
+            # windows crossing a day start are built too, the search never reads them
+            self._lows.append(np.minimum(self._lows[-1][:-width], self._lows[-1][width:]))
+            self._highs.append(np.maximum(self._highs[-1][:-width], self._highs[-1][width:]))
+            width *= 2
+
+    @classmethod
+    def fromFrame(cls, df, starts=None):
+        return cls(df['Open'].values, df['High'].values, df['Low'].values, df['Close'].values, starts)
+
+    def __len__(self):
+        return self._size
+
+    def firstTouch(self, price: float, start: int = 0, end: int = None) -> Optional[int]:
+        row = int(self.firstTouches(np.array([price], dtype='float64'), start, end)[0])
+        return None if row == NO_TOUCH else row
+
+    def firstTouches(self, prices, start=0, end=None) -> np.ndarray:
+        """
+        Vectorised version of firstTouch for many price levels at once.
+
+        :param prices: array of price levels, a NaN level is never touched
+        :param start: first row to look at, a scalar or one value per price
+        :param end: row to stop before, a scalar or one value per price, the end of the start's day by default
+        :return: int64 array of rows, NO_TOUCH where the price is never touched
+        """
+        prices = np.asarray(prices, dtype='float64')
+        positions = np.broadcast_to(np.asarray(start, dtype='int64'), prices.shape).copy()
+        days = np.maximum(np.searchsorted(self._starts, positions, side='right') - 1, 0)
+        ends = self._dayEnds[days]
+        if end is not None:
+            ends = np.minimum(ends, np.asarray(end, dtype='int64'))
+        result = np.full(prices.shape, NO_TOUCH, dtype='int64')
+        pending = np.flatnonzero((positions < ends) & ~np.isnan(prices))
+        while len(pending):
+            # every bar before the first one reaching up to P and before the first one reaching
+            # down to P misses it, so a bar satisfying both conditions is found at the farthest one
+            up = self._firstReaching(self._highs, prices[pending], positions[pending], ends[pending], np.less)
+            down = self._firstReaching(self._lows, prices[pending], positions[pending], ends[pending], np.greater)
+            found = up == down
+            hit = found & (up < ends[pending])
+            result[pending[hit]] = up[hit]
+            positions[pending] = np.maximum(up, down)
+            pending = pending[~found & (positions[pending] < ends[pending])]
+        return result
+
+    def _firstReaching(self, levels, prices, positions, ends, misses):
+        positions = positions.copy()
+        for level in range(len(levels) - 1, -1, -1):
+            width = 1 << level
+            table = levels[level]
+            fits = positions + width <= ends
+            window = table[np.minimum(positions, len(table) - 1)]
+            skip = fits & misses(window, prices)
+            positions[skip] += width
+        return positions
+
+
+class TouchTracker:
+    """
+    Incremental counterpart of FirstTouchIndex for bars arriving one by one: remembers the first bar touching the
+    entry price and the first later bar touching the stop price. A bar may be passed again while it is still
+    forming, its range only grows so an earlier answer stays valid.
+    """
+
+    def __init__(self, entryPrice: float = None, stopPrice: float = None):
+        self.entryPrice = entryPrice
+        self.stopPrice = stopPrice
+        self.entryRow = None
+        self.stopRow = None
+
+    def update(self, row: int, open: float, high: float, low: float, close: float) -> bool:
+        """:return: True when the bar is the entry or the stop touch"""
+        prices = [price for price in (open, high, low, close) if price == price]
+        if not prices or (open != open and close != close):
+            # see touchEnvelopes
+            return False
+        low = min(prices)
+        high = max(prices)
+        if self.entryRow is None:
+            if self.entryPrice is not None and low <= self.entryPrice <= high:
+                self.entryRow = row
+                return True
+        elif self.stopRow is None and row > self.entryRow:
+            if self.stopPrice is not None and low <= self.stopPrice <= high:
+                self.stopRow = row
+                return True
+        return False
@@ -0,0 +1,109 @@
+"""
+Downloader benchmark against the local fake gateway, no IB Gateway is needed.
+
+    python3 benchmarks/download.py --concurrency 1,5,10 --latency 0.2
+    python3 benchmarks/download.py --error-rate 0.05 --drop-end-rate 0.02 --timeout 2
+
+A synthetic 1 min file is downloaded month by month with DownloadJob for every concurrency level and the
+wall time, bars per second, timeouts, failed requests and retries are reported. The IB pacing limits are off
+unless --pacing is given, so the numbers show the client and not the pacing rules.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIRECTORY, os.pardir, 'histdata'))
+from synthetic import writeSymbols
+
+DEFAULT_CONCURRENCY = '1,5,10'
+DEFAULT_YEARS = 1
+UNLIMITED = 10 ** 9
+
+
+def runCase(gateway, symbol: str, concurrency: int, pacing: bool, directory: str) -> dict:
+    from fakegateway import FakeBrokerClient
+    from jobs import DownloadJob, RetryPolicy
+    from metrics import MetricsAggregator
+    from pacing import PacingScheduler
+
+    scheduler = PacingScheduler() if pacing else \
+        PacingScheduler(maxRequests=UNLIMITED, identicalRequestSeconds=0, maxSameContractRequests=UNLIMITED)
+    client = FakeBrokerClient(gateway, concurrency, scheduler, concurrency)
+    metrics = MetricsAggregator()
+    client.register(metrics)
+    retries = []
+    client.register(lambda message, *args: retries.append(message) if ', retry ' in str(message) else None)
+    try:
+        contract = client.buildContract(symbol, 'STK', 'SMART', 'USD')
+        bars = gateway.loadBars(symbol)
+        first, last = [pd.Timestamp(value, tz='UTC').date() for value in (bars.times[0], bars.times[-1])]
+        fileName = os.path.join(directory, f'{symbol}_{concurrency}.csv')
+        started = time.perf_counter()
+        summary = DownloadJob(client, contract, first, last, '1 min', fileName,
+                              RetryPolicy(initialDelay=0.1)).run()
+        seconds = time.perf_counter() - started
+    finally:
+        client.disconnect()
+    totals = metrics.summary()
+    return {
+        'concurrency': concurrency,
+        'seconds': seconds,
+        'bars': summary.bars,
+        'chunks': summary.chunks,
+        'barsPerSecond': summary.bars / seconds if seconds else None,
+        'timeouts': totals['timeouts'],
+        'failures': totals['failures'],
+        'retries': len(retries),
+        'meanChunkSeconds': totals['meanChunkSeconds'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default=DEFAULT_CONCURRENCY, help='comma separated requests in flight')
+    parser.add_argument('--years', type=float, default=DEFAULT_YEARS)
+    parser.add_argument('--latency', type=float, default=0.2, help='gateway answer latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--drop-end-rate', type=float, default=0.0)
+    parser.add_argument('--timeout', type=float, help='seconds before a request without an end is given up')
+    parser.add_argument('--pacing', action='store_true', help='keep the IB pacing limits')
+    parser.add_argument('--data', default=os.path.join(tempfile.gettempdir(), 'backtest_utils_benchmarks'))
+    parser.add_argument('--output', help='json file to write the results to')
+    args = parser.parse_args()
+
+    try:
+        import histdata
+        from fakegateway import FakeGateway, GatewayBehaviour
+    except ImportError as e:
+        print(f"downloader dependencies are missing: {e}")
+        sys.exit(1)
+    if args.timeout is not None:
+        histdata.MAX_WAIT_SECONDS = args.timeout
+
+    fileName = writeSymbols(args.data, args.years)[0]
+    symbol = os.path.basename(fileName).split('_')[0].upper()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for concurrency in [int(value) for value in args.concurrency.split(',')]:
+            gateway = FakeGateway({symbol: fileName}, GatewayBehaviour(
+                latency=args.latency, jitter=args.jitter, errorRate=args.error_rate,
+                dropEndRate=args.drop_end_rate))
+            result = runCase(gateway, symbol, concurrency, args.pacing, directory)
+            results.append(result)
+            print(f"concurrency {concurrency:>3} {result['seconds']:>8.2f} s {result['bars']:>9} bars "
+                  f"{result['barsPerSecond']:>10.0f} bars/s  timeouts {result['timeouts']} "
+                  f"failures {result['failures']} retries {result['retries']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'arguments': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Performance benchmarks over synthetic files of growing size.
+
+    python3 benchmarks/run.py --years 0.25,1,4 --output results.json
+    python3 benchmarks/run.py --years 0.25,1,4 --compare results.json
+
+Every case reports the best wall time of --repeat runs, rows per second and the peak of traced python/numpy
+allocations. With --compare the results are matched against an earlier json by case and size, and the run fails
+when a case got slower than --threshold times.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from backtest import barcache
+from backtest.dayindex import DayIndex
+from backtest.engine import loadDays, dayOpens, runEntryStop
+from backtest.indicators import IndicatorEngine
+from backtest.merge import mergeFiles
+from backtest.resample import resampleBars, resampleChunks
+from backtest.touch import FirstTouchIndex, NO_TOUCH
+from synthetic import writeSymbols
+
+DEFAULT_YEARS = '0.25,1'
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 1.25
+LOOKUPS = 1000
+CHECK_ROWS = 5000
+CHECK_PRICES = 500
+CHECK_TZ = 'US/Eastern'
+
+
+def measure(function, repeat: int):
+    """:return: best seconds over repeat runs and peak traced bytes of the first run"""
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak
+
+
+def chartWindow():
+    """
+    MainWindow with the state its data methods use, without creating any Qt widget.
+    Returns None when the chart dependencies are not installed.
+    """
+    try:
+        from chart import MainWindow
+    except ImportError:
+        return None
+    return MainWindow.__new__(MainWindow)
+
+
+def chartCases(filename: str):
+    window = chartWindow()
+    if window is None:
+        print("chart dependencies are missing, MainWindow cases are skipped")
+        return []
+
+    window.df = window.loadData(filename)
+    window.times = barcache.frameTimes(window.df)
+    window.dayIndex = DayIndex(window.times)
+    days = [window.dayIndex.dayAt(position) for position in range(len(window.dayIndex))]
+    middle = days[len(days) // 2]
+    start = pd.Timestamp(middle, tz='UTC')
+    end = start + pd.Timedelta(days=1)
+    lookups = [days[position] for position in np.linspace(0, len(days) - 1, LOOKUPS).astype(int)]
+
+    def coldLoad():
+        barcache.invalidate(filename)
+        window.loadData(filename)
+
+    def isDfHasDate():
+        for day in lookups:
+            window.isDfHasDate(day)
+
+    from chart import EntryStopLine
+    esLine = EntryStopLine()
+    quotes = window.calculateQuotes(start, end)
+    price = float(quotes['Close'].iat[len(quotes) // 2])
+
+    return [
+        ('MainWindow.loadData/cold', coldLoad, 1),
+        ('MainWindow.loadData/cached', lambda: window.loadData(filename), 1),
+        ('MainWindow.calculateQuotes/day', lambda: window.calculateQuotes(start, end), 1),
+        ('MainWindow.isDfHasDate/x1000', isDfHasDate, LOOKUPS),
+        ('EntryStopLine._ochlIntersectionMask/day', lambda: esLine._ochlIntersectionMask(quotes, price), 1),
+        ('EntryStopLine._ochlIntersectionMask/file', lambda: esLine._ochlIntersectionMask(window.df, price), 1),
+    ]
+
+
+def checkTouchIndex(seed: int = 0) -> bool:
+    """
+    FirstTouchIndex against the reference EntryStopLine._ochlIntersectionMask on random gapping bars split into
+    random days, some of them without prices, without open and close or with one price missing.
+    Skipped when the chart dependencies are not installed.
+    """
+    try:
+        from chart import EntryStopLine
+    except ImportError:
+        print("chart dependencies are missing, the touch index check is skipped")
+        return True
+
+    random = np.random.default_rng(seed)
+    close = 100 + np.cumsum(random.normal(0, 0.5, CHECK_ROWS))
+    open = close + random.normal(0, 0.5, CHECK_ROWS)
+    high = np.maximum(open, close) + random.exponential(0.2, CHECK_ROWS)
+    low = np.minimum(open, close) - random.exponential(0.2, CHECK_ROWS)
+    columns = [open, high, low, close]
+    for column in columns:
+        column[random.random(CHECK_ROWS) < 0.02] = np.nan
+    emptyRows = random.random(CHECK_ROWS) < 0.05
+    for column in columns:
+        column[emptyRows] = np.nan
+    highLowOnlyRows = random.random(CHECK_ROWS) < 0.02
+    open[highLowOnlyRows] = close[highLowOnlyRows] = np.nan
+    df = pd.DataFrame(dict(zip(['Open', 'High', 'Low', 'Close'], columns)))
+    dayStarts = np.unique(np.append(0, random.integers(0, CHECK_ROWS, CHECK_ROWS // 200)))
+    dayEnds = np.append(dayStarts[1:], CHECK_ROWS)
+
+    prices = random.uniform(np.nanmin(low), np.nanmax(high), CHECK_PRICES)
+    starts = random.integers(0, CHECK_ROWS, CHECK_PRICES)
+    rows = FirstTouchIndex(open, high, low, close, dayStarts).firstTouches(prices, starts)
+    esLine = EntryStopLine()
+    for price, start, row in zip(prices, starts, rows):
+        end = dayEnds[np.searchsorted(dayStarts, start, side='right') - 1]
+        touches = np.flatnonzero(esLine._ochlIntersectionMask(df.iloc[start:end], price).values)
+        expected = start + touches[0] if len(touches) else NO_TOUCH
+        if row != expected:
+            print(f"FirstTouchIndex found row {row} for {price} from row {start}, the mask finds {expected}")
+            return False
+    return True
+
+
+def checkIndicators(seed: int = 0) -> bool:
+    """
+    Every indicator computed over a whole history against the same bars passed to update one by one, each of them
+    first as a forming bar, on random bars with time gaps, missing prices and missing volumes.
+    """
+    random = np.random.default_rng(seed)
+    times = pd.Timestamp('2020-01-02 14:30', tz='UTC').value + \
+        np.cumsum(random.integers(1, 30, CHECK_ROWS)) * 60 * 10 ** 9
+    close = 100 + np.cumsum(random.normal(0, 0.5, CHECK_ROWS))
+    open = close + random.normal(0, 0.5, CHECK_ROWS)
+    high = np.maximum(open, close) + random.exponential(0.2, CHECK_ROWS)
+    low = np.minimum(open, close) - random.exponential(0.2, CHECK_ROWS)
+    volume = random.integers(1, 1000, CHECK_ROWS).astype('float64')
+    columns = [open, high, low, close, volume]
+    for column in columns:
+        column[random.random(CHECK_ROWS) < 0.02] = np.nan
+    emptyRows = random.random(CHECK_ROWS) < 0.05
+    for column in columns:
+        column[emptyRows] = np.nan
+    bars = barcache.BarArrays(times, *columns)
+
+    computed = IndicatorEngine(tz=CHECK_TZ).compute(bars, DayIndex(times, CHECK_TZ))
+    engine = IndicatorEngine(tz=CHECK_TZ)
+    for row in range(CHECK_ROWS):
+        forming = (high[row] + low[row]) / 2
+        engine.update(row, int(times[row]), open[row], forming, forming, forming, volume[row] / 2)
+        values = engine.update(row, int(times[row]), open[row], high[row], low[row], close[row], volume[row])
+        for name, value in values.items():
+            expected = computed[name][row]
+            if not (np.isclose(value, expected, rtol=1e-9) or (np.isnan(value) and np.isnan(expected))):
+                print(f"{name} update gives {value} at row {row}, compute gives {expected}")
+                return False
+    return True
+
+
+def dataCases(filename: str, workDirectory: str):
+    bars, dayIndex = loadDays(filename)
+    opens = dayOpens(bars, dayIndex)
+    indexed = barcache.loadFrame(filename, tz='US/Eastern').set_index('DateTime')
+    half = len(indexed) // 2
+    # two overlapping halves, the merge has to drop a quarter of the rows as duplicates
+    firstHalf = os.path.join(workDirectory, 'first.csv')
+    secondHalf = os.path.join(workDirectory, 'second.csv')
+    indexed.iloc[:half + half // 2].to_csv(firstHalf)
+    indexed.iloc[half // 2:].to_csv(secondHalf)
+    merged = os.path.join(workDirectory, 'merged.csv')
+    prices = np.linspace(bars.low.min(), bars.high.max(), LOOKUPS)
+    # every price searched from the start of a day spread over the file
+    lookupStarts = dayIndex.starts[np.linspace(0, len(dayIndex) - 1, LOOKUPS).astype(int)]
+
+    def chunkedResample():
+        for _ in resampleChunks(barcache.iterCsv(filename, 100_000, tz='US/Eastern'), '5min'):
+            pass
+
+    def touchIndex():
+        FirstTouchIndex(bars.open, bars.high, bars.low, bars.close, dayIndex.starts).firstTouches(prices, lookupStarts)
+
+    return [
+        ('resampleBars/5min', lambda: resampleBars(indexed, '5min'), 1),
+        ('resampleChunks/5min', chunkedResample, 1),
+        ('mergeFiles/2', lambda: mergeFiles([firstHalf, secondHalf], merged), 1),
+        ('FirstTouchIndex/build+1000', touchIndex, 1),
+        ('runEntryStop/file', lambda: runEntryStop(bars, dayIndex, opens + 0.1, opens - 0.2), 1),
+        ('IndicatorEngine.compute/file', lambda: IndicatorEngine().compute(bars, dayIndex), 1),
+    ]
+
+
+def runSuite(years, barMinutes: int, symbols: int, repeat: int, directory: str):
+    results = []
+    for size in years:
+        filenames = writeSymbols(directory, size, barMinutes, symbols)
+        with tempfile.TemporaryDirectory() as workDirectory:
+            for filename in filenames:
+                rows = len(barcache.loadBars(filename))
+                for case, function, calls in chartCases(filename) + dataCases(filename, workDirectory):
+                    seconds, peak = measure(function, repeat)
+                    result = {
+                        'case': case,
+                        'years': size,
+                        'barMinutes': barMinutes,
+                        'rows': rows,
+                        'seconds': seconds / calls,
+                        'rowsPerSecond': rows * calls / seconds if seconds else None,
+                        'peakBytes': peak,
+                    }
+                    results.append(result)
+                    print(f"{case:45} {rows:>10} rows {seconds / calls * 1000:>12.3f} ms "
+                          f"{peak / 2 ** 20:>10.1f} MiB")
+    return results
+
+
+def environment():
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def compare(results, baselineFile: str, threshold: float) -> bool:
+    """Prints the time ratio of every case against the baseline, returns False on a regression"""
+    with open(baselineFile) as f:
+        baseline = {(result['case'], result['rows']): result for result in json.load(f)['results']}
+    isOk = True
+    for result in results:
+        previous = baseline.get((result['case'], result['rows']))
+        if previous is None or not previous['seconds']:
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        mark = 'REGRESSION' if ratio > threshold else ''
+        isOk = isOk and ratio <= threshold
+        print(f"{result['case']:45} {result['rows']:>10} rows x{ratio:6.2f} {mark}")
+    return isOk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', default=DEFAULT_YEARS, help='comma separated file sizes in years of bars')
+    parser.add_argument('--bar-minutes', type=int, default=1)
+    parser.add_argument('--symbols', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--data', default=os.path.join(tempfile.gettempdir(), 'backtest_utils_benchmarks'),
+                        help='directory for the synthetic files, they are reused between runs')
+    parser.add_argument('--output', help='json file to write the results to')
+    parser.add_argument('--compare', help='json file of an earlier run')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    if not checkTouchIndex() or not checkIndicators():
+        sys.exit(1)
+    years = [float(value) for value in args.years.split(',')]
+    results = runSuite(years, args.bar_minutes, args.symbols, args.repeat, args.data)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Deterministic synthetic OHLCV bars shaped like the downloader output: regular US session bars on weekdays,
+timestamps written in US/Eastern with their offset.
+"""
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+SESSION_OPEN = pd.Timedelta(hours=9, minutes=30)
+SESSION_MINUTES = 390
+DEFAULT_START = '2015-01-01'
+
+
+def sessionTimes(years: float, barMinutes: int, start=DEFAULT_START) -> pd.DatetimeIndex:
+    days = pd.bdate_range(start, periods=max(1, int(round(years * 252))))
+    offsets = pd.to_timedelta(np.arange(0, SESSION_MINUTES, barMinutes), unit='min') + SESSION_OPEN
+    local = (days.values[:, None] + offsets.values[None, :]).ravel()
+    return pd.DatetimeIndex(local).tz_localize('US/Eastern')
+
+
+def generateBars(years: float, barMinutes: int = 1, seed: int = 0, start=DEFAULT_START,
+                 startPrice: float = 100.0) -> pd.DataFrame:
+    """Random walk bars, the same arguments always give the same bars"""
+    times = sessionTimes(years, barMinutes, start)
+    rng = np.random.default_rng(seed)
+    size = len(times)
+    steps = rng.normal(0, 0.001 * np.sqrt(barMinutes), size)
+    close = startPrice * np.exp(np.cumsum(steps))
+    open = np.concatenate(([startPrice], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.0005 * np.sqrt(barMinutes), size)) * close
+    df = pd.DataFrame({
+        'DateTime': times,
+        'Open': open.round(2),
+        'High': (np.maximum(open, close) + spread).round(2),
+        'Low': (np.minimum(open, close) - spread).round(2),
+        'Close': close.round(2),
+        'Volume': rng.integers(100, 100_000, size),
+    })
+    return df
+
+
+def writeSymbols(directory: str, years: float, barMinutes: int = 1, symbols: int = 1) -> List[str]:
+    """Writes one csv per synthetic symbol, files are reused when they already exist"""
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for seed in range(symbols):
+        filename = os.path.join(directory, f'sym{seed}_{years}y_{barMinutes}min.csv')
+        if not os.path.exists(filename):
+            generateBars(years, barMinutes, seed).to_csv(filename, index=False)
+        filenames.append(filename)
+    return filenames
@@ -1,69 +1,145 @@
 import datetime
+import os
 import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 
 import finplot
+import numpy as np
 import pandas as pd
 import pyqtgraph as pg
-from PyQt5 import QtWidgets, uic
+from PyQt5 import QtWidgets, QtCore, uic
 from dateutil.tz import gettz
 
+from backtest import barcache
+from backtest.dayindex import DayIndex
+from backtest.indicators import IndicatorEngine, defaultIndicators
+from backtest.pyramid import BarPyramid
+from backtest.touch import FirstTouchIndex, TouchTracker
+
+
+# Moving a line and swapping the bars of existing items have no public finplot API, the two functions below are the
+# only places using finplot internals. They are written against finplot 1.7, the version pinned in requirements.txt.
+def finplotTimesToX(ax, times) -> list:
+    """x indices of timestamps on the axis, the mapping finplot.add_line does for a new line"""
+    return list(finplot._pdtime2index(ax, pd.Series(times)))
+
+
+def finplotReplaceData(ax, items, quotes):
+    """Swaps the frame shared by the items of the axis and zooms to it like finplot does for a new plot"""
+    df = finplot.PandasDataSource(quotes).df
+    for item in items:
+        item.datasrc.set_df(df)
+    datasrc = items[0].datasrc
+    finplot._set_x_limits(ax, datasrc)
+    ax.vb.set_datasrc(datasrc)
+    ax.vb.pre_process_data()
+    ax.vb.update_y_zoom(datasrc.init_x0, datasrc.init_x1)
+
 
 class EntryStopLine:
+    """
+    Entry and stop price lines and the markers of their first touches. Every line item is created on its first
+    draw and moved on the next ones, a line with nothing to show is hidden, so redrawing does not add items.
+    """
+
     def __init__(self):
-        pass
+        self._touchIndex = None
+        self._touchIndexKey = None
+        self._lines = {}
 
     def redraw(self, df, entryPrice, stopPrice, fromTimestamp, toTimestamp):
         y_max = df['High'].max()
         y_min = df['Low'].min()
         int_step = (y_max - y_min) / 100
-        first_intersection = None
+        entryRow = None
+        touchIndex = self.touchIndex(df)
+        self.hide()
 
         self._redrawEntryPointLine(entryPrice, fromTimestamp, toTimestamp)
         if entryPrice:
-            first_intersection = self._drawEntryPriceIntersection(df, entryPrice, first_intersection, int_step)
+            entryRow = self._drawEntryPriceIntersection(df, touchIndex, entryPrice, int_step)
 
         self._redrawStopLossLine(stopPrice, fromTimestamp, toTimestamp)
-        if stopPrice and first_intersection is not None:
-            self._drawStopPriceIntersection(df, first_intersection, stopPrice, y_max, y_min)
-
-    def _drawStopPriceIntersection(self, df, first_intersection, stopPrice, y_max, y_min):
+        if stopPrice and entryRow is not None:
+            self._drawStopPriceIntersection(df, touchIndex, entryRow, stopPrice, y_max, y_min)
+
+    def touchIndex(self, df) -> FirstTouchIndex:
+        """
+        Returns the first touch index of the given quotes, it is rebuilt only when other quotes are drawn
+        so retyping entry and stop prices costs two index lookups
+        """
+        key = (len(df), df['DateTime'].iat[0], df['DateTime'].iat[-1]) if len(df) else None
+        if self._touchIndex is None or key != self._touchIndexKey:
+            self._touchIndex = FirstTouchIndex.fromFrame(df)
+            self._touchIndexKey = key
+        return self._touchIndex
+
+    def _drawStopPriceIntersection(self, df, touchIndex, entryRow, stopPrice, y_max, y_min):
         price = float(stopPrice)
-        stop_df = df[df['DateTime'] > first_intersection['DateTime']]
-        intersections = stop_df[self._ochlIntersectionMask(stop_df, price)]
-        intersections.reset_index(inplace=True)
-        size = len(intersections)
-        if size > 0:
-            candle = intersections.iloc[0]
-            finplot.add_line((candle['DateTime'], y_min), (candle['DateTime'], y_max),
-                             color='f7ff00', interactive=False, width=3)
-
-    def _drawEntryPriceIntersection(self, df, entryPrice, first_intersection, int_step):
+        row = touchIndex.firstTouch(price, start=entryRow + 1)
+        if row is not None:
+            self._drawStopMarker(df['DateTime'].iat[row], y_max, y_min)
+
+    def _drawStopMarker(self, dateTime, y_max, y_min):
+        self._drawLine('stopMarker', (dateTime, y_min), (dateTime, y_max), 'f7ff00', width=3)
+
+    def _drawEntryPriceIntersection(self, df, touchIndex, entryPrice, int_step):
         price = float(entryPrice)
-        intersections = df[self._ochlIntersectionMask(df, price)]
-        intersections.reset_index(inplace=True)
-        size = len(intersections)
-        if size > 0:
-            first_intersection = intersections.iloc[0]
-            candle = intersections.iloc[0]
-            finplot.add_line((candle['DateTime'], price + int_step), (candle['DateTime'], price - int_step),
-                             color='9900ff', interactive=False, width=3)
-        return first_intersection
+        row = touchIndex.firstTouch(price)
+        if row is not None:
+            self._drawEntryMarker(df['DateTime'].iat[row], price, int_step)
+        return row
+
+    def _drawEntryMarker(self, dateTime, price, int_step):
+        self._drawLine('entryMarker', (dateTime, price + int_step), (dateTime, price - int_step), '9900ff', width=3)
+
+    def drawTrackedTouch(self, df, tracker: TouchTracker, row: int):
+        """Draws the marker of a touch found by a live TouchTracker on the given row of df"""
+        y_max = df['High'].max()
+        y_min = df['Low'].min()
+        dateTime = df['DateTime'].iat[row]
+        if row == tracker.entryRow:
+            self._drawEntryMarker(dateTime, tracker.entryPrice, (y_max - y_min) / 100)
+        elif row == tracker.stopRow:
+            self._drawStopMarker(dateTime, y_max, y_min)
+
+    def hide(self):
+        for line in self._lines.values():
+            line.setVisible(False)
 
     def _redrawEntryPointLine(self, price: str, fromTimestamp, toTimestamp):
-        self._redrawLine(price, fromTimestamp, toTimestamp, '9900ff')
+        self._redrawLine('entryLine', price, fromTimestamp, toTimestamp, '9900ff')
 
     def _redrawStopLossLine(self, price: str, fromTimestamp, toTimestamp):
-        self._redrawLine(price, fromTimestamp, toTimestamp, 'ff0000')
+        self._redrawLine('stopLine', price, fromTimestamp, toTimestamp, 'ff0000')
 
-    def _redrawLine(self, priceText: str, fromTimestamp, toTimestamp, color: str):
+    def _redrawLine(self, name: str, priceText: str, fromTimestamp, toTimestamp, color: str):
         if priceText:
             price = float(priceText)
-            finplot.add_line((fromTimestamp, price), (toTimestamp, price), color=color, interactive=False)
+            self._drawLine(name, (fromTimestamp, price), (toTimestamp, price), color)
+
+    def _drawLine(self, name: str, p0, p1, color: str, width=1):
+        line = self._lines.get(name)
+        if line is None:
+            self._lines[name] = finplot.add_line(p0, p1, color=color, interactive=False, width=width)
+            return
+        # the same price to y mapping finplot.add_line does for a new line
+        ax = line.ax
+        x0, x1 = finplotTimesToX(ax, [p0[0], p1[0]])
+        ix = ax.vb.yscale.invxform
+        line.prepareGeometryChange()
+        line.points = [(x0, ix(p0[1])), (x1, ix(p1[1]))]
+        line.setVisible(True)
+        line.update()
 
     def _span(self, l, r, value):
         return (l >= value) & (r <= value)
 
     def _ochlIntersectionMask(self, df, value):
+        # reference definition of a bar touching a price, FirstTouchIndex answers the same question
         o = df['Open']
         c = df['Close']
         h = df['High']
@@ -73,6 +149,164 @@ class EntryStopLine:
                | self._span(o, l, value) | self._span(c, l, value)
 
 
+# how long the view has to stay still before the level of detail is re-evaluated
+LEVEL_OF_DETAIL_DELAY_MS = 150
+# how many sliced day ranges are kept, stepping back and forth through them does not slice again
+PREPARED_DAYS = 32
+
+HISTDATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'histdata')
+LIVE_CONNECTION = ("127.0.0.1", 4001, 11)
+LIVE_BAR_SIZE = '1 min'
+# live bars are coalesced and applied to the chart at most this often
+LIVE_REFRESH_MS = 250
+# bars the live arrays hold before they grow for the first time
+LIVE_INITIAL_BARS = 1024
+# finplot.candlestick_ochl reads the first four columns by position
+CANDLE_COLUMNS = ['Open', 'Close', 'High', 'Low', 'Volume']
+# indicators drawn over the candles, name -> color
+OVERLAYS = OrderedDict([('VWAP', 'ff9900'), ('OpeningRangeHigh', '0099ff'), ('OpeningRangeLow', '0099ff')])
+
+
+def overlayIndicators() -> IndicatorEngine:
+    indicators = defaultIndicators()
+    return IndicatorEngine({name: indicators[name] for name in OVERLAYS})
+
+
+def sliceQuotes(df, times, start_date, end_date):
+    """Bars starting in [start_date, end_date), the same bars as PyramidLevel.slice"""
+    fromRow = times.searchsorted(start_date.value, side='left')
+    toRow = times.searchsorted(end_date.value, side='left')
+    return df.iloc[fromRow:toRow].reset_index(drop=True)
+
+
+@dataclass
+class LoadedFile:
+    filename: str
+    df: pd.DataFrame
+    times: np.ndarray
+    dayIndex: DayIndex
+    pyramid: BarPyramid
+    indicators: dict
+
+
+class FileLoader(QtCore.QThread):
+    """Loads a file and builds its day index and pyramid off the GUI thread"""
+    sig_progress = QtCore.pyqtSignal(int, str)
+    sig_loaded = QtCore.pyqtSignal(object)
+    sig_failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, filename: str, loadData):
+        super(FileLoader, self).__init__()
+        self.filename = filename
+        self._loadData = loadData
+
+    def run(self):
+        try:
+            self.sig_progress.emit(0, f'Loading {os.path.basename(self.filename)}')
+            df = self._loadData(self.filename)
+            self.sig_progress.emit(60, 'Indexing days')
+            times = barcache.frameTimes(df)
+            dayIndex = DayIndex(times)
+            self.sig_progress.emit(70, 'Resampling')
+            pyramid = BarPyramid(df)
+            self.sig_progress.emit(90, 'Computing indicators')
+            indicators = overlayIndicators().compute(barcache.BarArrays.fromFrame(df), dayIndex)
+            self.sig_progress.emit(100, '')
+        except Exception as e:
+            self.sig_failed.emit(f'Cannot load {self.filename}: {e}')
+            return
+        self.sig_loaded.emit(LoadedFile(self.filename, df, times, dayIndex, pyramid, indicators))
+
+
+class LiveBars:
+    """
+    Live bars and their overlay values in preallocated arrays which double when full, so appending a bar is O(1)
+    amortized instead of a copy of the whole frame. The frame for finplot is built once per refresh.
+    """
+
+    def __init__(self, columns, capacity: int = LIVE_INITIAL_BARS):
+        self.columns = list(columns)
+        self._times = np.empty(capacity, dtype='int64')
+        self._values = np.empty((capacity, len(self.columns)))
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def times(self) -> np.ndarray:
+        return self._times[:self._size]
+
+    def bar(self, row: int) -> np.ndarray:
+        """Values of a bar in the order of columns"""
+        return self._values[row]
+
+    def set(self, row: int, time: int, values):
+        """Replaces the bar at row, or appends it when row is the next one"""
+        if row == self._size:
+            if row == len(self._times):
+                self._times = np.concatenate((self._times, np.empty_like(self._times)))
+                self._values = np.concatenate((self._values, np.empty_like(self._values)))
+            self._size += 1
+        self._times[row] = time
+        self._values[row] = values
+
+    def toFrame(self) -> pd.DataFrame:
+        df = pd.DataFrame(self._values[:self._size], columns=self.columns, copy=True)
+        df.insert(0, barcache.TIME_COLUMN, barcache.timesToIndex(self.times.copy()))
+        return df
+
+
+class LiveConnector(QtCore.QThread):
+    """Connects to the broker and resolves the live contract off the GUI thread"""
+    sig_connected = QtCore.pyqtSignal(object, object)
+    sig_failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, ticker: str, connect):
+        super(LiveConnector, self).__init__()
+        self.ticker = ticker
+        self._connect = connect
+
+    def run(self):
+        try:
+            client, contract = self._connect(self.ticker)
+        except Exception as e:
+            self.sig_failed.emit(str(e))
+            return
+        self.sig_connected.emit(client, contract)
+
+
+class QuotesCache:
+    """Least recently used quotes by (filename, start, end), shared by the GUI and the prefetch thread"""
+
+    def __init__(self, maxSize: int):
+        self._maxSize = maxSize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            quotes = self._items.get(key)
+            if quotes is not None:
+                self._items.move_to_end(key)
+            return quotes
+
+    def put(self, key, quotes):
+        with self._lock:
+            self._items[key] = quotes
+            self._items.move_to_end(key)
+            while len(self._items) > self._maxSize:
+                self._items.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self, *args, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
@@ -88,87 +322,443 @@ class MainWindow(QtWidgets.QMainWindow):
         self.verticalLayout.addWidget(fp)
         self.dayDateEdit.setDate(datetime.date.today())
         self.candleItems = None
+        self.overlayItems = []
         self.df = None
+        self.times = None
+        self.dayIndex = None
+        self.pyramid = None
+        self.indicators = None
+        self.rawQuotes = None
+        self.quotes = None
+        self.quotesTimes = None
+        self.displayedLevel = None
+        self.displayedRange = None
+        self.selectedRange = None
         self.filename = None
+        self.ticker = ''
         self.isFileFirstOpen = True
         self.esLines= EntryStopLine()
         self.hoverLabel = finplot.add_legend('', ax=self.ax)
         finplot.set_time_inspector(self.updateLegend, ax=self.ax, when='hover')
         finplot.display_timezone = gettz('America/New_York')
+        self.levelOfDetailTimer = QtCore.QTimer(self)
+        self.levelOfDetailTimer.setSingleShot(True)
+        self.levelOfDetailTimer.setInterval(LEVEL_OF_DETAIL_DELAY_MS)
+        self.levelOfDetailTimer.timeout.connect(self.updateLevelOfDetail)
+        self.ax.vb.sigXRangeChanged.connect(lambda *_: self.levelOfDetailTimer.start())
+        self.liveClient = None
+        self.liveConnector = None
+        self.liveReqId = None
+        self.liveUpdates = None
+        self.liveBars = None
+        self.liveIndicators = None
+        self.touchTracker = None
+        self.liveTimer = QtCore.QTimer(self)
+        self.liveTimer.setInterval(LIVE_REFRESH_MS)
+        self.liveTimer.timeout.connect(self.updateLive)
+        self.loader = None
+        self.retiredThreads = set()
+        self.quotesCache = QuotesCache(PREPARED_DAYS)
+        self.prefetchPool = ThreadPoolExecutor(max_workers=1)
+        self.progressBar = QtWidgets.QProgressBar()
+        self.progressBar.setMaximumWidth(200)
+        self.progressBar.hide()
+        self.statusbar.addPermanentWidget(self.progressBar)
 
     def initConnections(self):
         self.actionOpen.triggered.connect(self.openFileActionCall)
         self.calculatePushButton.clicked.connect(self.updatePlot)
+        self.previousDayPushButton.clicked.connect(self.showPreviousDay)
+        self.nextDayPushButton.clicked.connect(self.showNextDay)
+        self.priceLineEdit.returnPressed.connect(self.updatePlot)
+        self.stopPriceEdit.returnPressed.connect(self.updatePlot)
+        self.actionLive.toggled.connect(self.toggleLive)
 
     def openFileActionCall(self):
         filename = QtWidgets.QFileDialog.getOpenFileName(self, 'Open File', filter="*.csv")
         self.filename = filename[0]
+        self.ticker = os.path.basename(self.filename).split(".")[0]
         self.isFileFirstOpen = False
         self.df = None
+        self.times = None
+        self.dayIndex = None
+        self.pyramid = None
+        self.indicators = None
+        self.rawQuotes = None
+        self.quotes = None
+        self.quotesTimes = None
+        self.displayedLevel = None
+        self.quotesCache.clear()
 
     def calculateQuotes(self, start_date: datetime, end_date: datetime):
-        quotes = self.df.loc[(self.df['DateTime'] > start_date) & (self.df['DateTime'] < end_date)]
-        quotes.reset_index(inplace=True)
-        return quotes[['DateTime', 'Open', 'Close', 'High', 'Low']]
+        return sliceQuotes(self.df, self.times, start_date, end_date)
 
     def updateCandlePane(self, quotes):
-        self.ax.reset()
-        finplot.candlestick_ochl(quotes)
-        finplot.refresh()
-        self.hoverLabel = finplot.add_legend('', ax=self.ax)
-        finplot.set_time_inspector(self.updateLegend, ax=self.ax, when='hover')
+        """
+        The candlestick and overlay items are created once, later quotes replace their data in place, so stepping
+        through days does not rebuild the plot, the legend or the entry and stop lines
+        """
+        if self.candleItems is None:
+            self.candleItems = finplot.candlestick_ochl(quotes[[barcache.TIME_COLUMN] + CANDLE_COLUMNS], ax=self.ax)
+            self.overlayItems = [finplot.plot(quotes[barcache.TIME_COLUMN], quotes[name], ax=self.ax, color=color)
+                                 for name, color in OVERLAYS.items()]
+            finplot.refresh()
+        else:
+            self.replaceCandles(quotes)
+
+    def replaceCandles(self, quotes):
+        """Swaps the bars of the candlestick and overlay items and zooms to them like finplot does for a new plot"""
+        # all the items of the axis share one frame, the quotes have its columns in the same order
+        finplotReplaceData(self.ax, [self.candleItems] + self.overlayItems, quotes)
+        self.candleItems.repaint()
+        self.redrawOverlays()
+
+    def redrawOverlays(self):
+        for item in self.overlayItems:
+            item.setData(item.datasrc.index, item.datasrc.y)
 
     def updatePlot(self):
+        if self.actionLive.isChecked():
+            # the live bars are not mixed with the bars of the file
+            self.statusbar.showMessage('Stop live mode to show the file')
+            return
+
         if self.isFileFirstOpen:
             self.openFileActionCall()
             self.isFileFirstOpen = False
 
         if self.df is None:
-            self.df = self.loadData(self.filename)
-            minDateTime = min(self.df['DateTime'])
-            self.dayDateEdit.setDate(minDateTime.date())
+            # plotted when the loader is done
+            self.loadFile(self.filename)
+            return
 
         end_date, start_date = self.calculateDateRange()
 
         if self.isDfHasDate(start_date):
             self.statusbar.showMessage('')
 
-            quotes = self.calculateQuotes(start_date, end_date)
-            self.updateCandlePane(quotes)
-
-            fromTimestamp = quotes['DateTime'].min()
-            toTimestamp = quotes['DateTime'].max()
-            entryPrice = self.priceLineEdit.text()
-            stopPrice = self.stopPriceEdit.text()
-            self.esLines.redraw(quotes, entryPrice, stopPrice, fromTimestamp, toTimestamp)
+            quotes = self.dayQuotes(start_date, end_date)
+            self.selectedRange = (start_date.value, end_date.value)
+            self.rawQuotes = quotes
+            self.showLevel(self.pyramid.levelFor(*self.selectedRange), *self.selectedRange)
+            self.prefetchAdjacentDays(start_date.date())
 
         else:
             self.statusbar.showMessage(f'No record for {start_date.day_name()}: {start_date}')
 
+    def loadFile(self, filename: str):
+        if self.loader is not None and self.loader.isRunning() and self.loader.filename == filename:
+            return
+        if self.loader is not None:
+            # a load still running for an earlier file is left to finish, what it emits is ignored
+            self.retireThread(self.loader)
+        self.calculatePushButton.setEnabled(False)
+        self.progressBar.setValue(0)
+        self.progressBar.show()
+        self.loader = FileLoader(filename, self.loadData)
+        self.loader.sig_progress.connect(self.showLoadingProgress)
+        self.loader.sig_loaded.connect(self.fileLoaded)
+        self.loader.sig_failed.connect(self.fileLoadFailed)
+        self.loader.start()
+
+    def showLoadingProgress(self, percent: int, message: str):
+        if self.sender() is not self.loader:
+            return
+        self.progressBar.setValue(percent)
+        self.statusbar.showMessage(message)
+
+    def fileLoaded(self, loaded: LoadedFile):
+        if self.sender() is not self.loader:
+            return
+        self.progressBar.hide()
+        self.calculatePushButton.setEnabled(not self.actionLive.isChecked())
+        if loaded.filename != self.filename:
+            # another file was opened meanwhile
+            self.updatePlot()
+            return
+        self.df = loaded.df
+        self.times = loaded.times
+        self.dayIndex = loaded.dayIndex
+        self.pyramid = loaded.pyramid
+        self.indicators = loaded.indicators
+        if len(self.dayIndex) == 0:
+            self.statusbar.showMessage(f'No bars in {os.path.basename(loaded.filename)}')
+            return
+        self.dayDateEdit.setDate(self.dayIndex.firstDay())
+        self.updatePlot()
+
+    def fileLoadFailed(self, message: str):
+        if self.sender() is not self.loader:
+            return
+        self.progressBar.hide()
+        self.calculatePushButton.setEnabled(not self.actionLive.isChecked())
+        self.statusbar.showMessage(message)
+
+    def dayQuotes(self, start_date, end_date):
+        key = (self.filename, start_date.value, end_date.value)
+        quotes = self.quotesCache.get(key)
+        if quotes is None:
+            quotes = self.calculateQuotes(start_date, end_date)
+            self.quotesCache.put(key, quotes)
+        return quotes
+
+    def prefetchAdjacentDays(self, day):
+        """Slices the previous and the next trading day ranges in the background"""
+        for adjacent in [self.dayIndex.previousDay(day), self.dayIndex.nextDay(day)]:
+            if adjacent is None:
+                continue
+            end_date, start_date = self.dateRange(adjacent)
+            key = (self.filename, start_date.value, end_date.value)
+            if key not in self.quotesCache:
+                self.prefetchPool.submit(self.prefetchQuotes, key, self.df, self.times, start_date, end_date)
+
+    def prefetchQuotes(self, key, df, times, start_date, end_date):
+        # runs on the prefetch thread with the frame of the file it was submitted for
+        self.quotesCache.put(key, sliceQuotes(df, times, start_date, end_date))
+
+    def showLevel(self, level, start: int, end: int):
+        """Plots the bars of a pyramid level starting in [start, end) and redraws entry and stop lines on top"""
+        self.displayedLevel = level
+        self.displayedRange = (start, end)
+        quotes = level.slice(start, end)
+        self.quotesTimes = barcache.frameTimes(quotes)
+        self.quotes = self.addOverlays(quotes, end)
+        self.updateCandlePane(self.quotes)
+        self.redrawEntryStop()
+
+    def addOverlays(self, quotes, end: int):
+        """
+        Adds the overlay indicators to the displayed bars, a bar of a coarser level gets the values of the last raw
+        bar inside it. The indicators are computed once per file, so drawing them is a lookup per displayed bar.
+        """
+        nextStarts = np.append(self.quotesTimes[1:], end)
+        rows = self.times.searchsorted(nextStarts, side='left') - 1
+        for name in OVERLAYS:
+            quotes[name] = self.indicators[name][rows]
+        return quotes
+
+    def redrawEntryStop(self):
+        # touches are always evaluated on raw bars, whatever level is displayed
+        quotes = self.rawQuotes
+        fromTimestamp = quotes['DateTime'].min()
+        toTimestamp = quotes['DateTime'].max()
+        entryPrice = self.priceLineEdit.text()
+        stopPrice = self.stopPriceEdit.text()
+        self.esLines.redraw(quotes, entryPrice, stopPrice, fromTimestamp, toTimestamp)
+
+    def updateLevelOfDetail(self):
+        """
+        Picks the finest pyramid level keeping the visible span under pyramid.DEFAULT_MAX_BARS candles. When it changes,
+        or the view leaves the plotted window, the visible span plus one span on each side is plotted again.
+        """
+        if self.pyramid is None or self.liveClient is not None or self.quotesTimes is None \
+                or len(self.quotesTimes) == 0:
+            return
+        x0, x1 = self.ax.vb.viewRange()[0]
+        lastRow = len(self.quotesTimes) - 1
+        visibleStart = self.quotesTimes[min(max(int(x0), 0), lastRow)]
+        visibleEnd = self.quotesTimes[min(max(int(x1), 0), lastRow)] + 1
+        level = self.pyramid.levelFor(visibleStart, visibleEnd)
+        displayedStart, displayedEnd = self.displayedRange
+        isInside = displayedStart <= visibleStart and visibleEnd <= displayedEnd
+        if level is self.displayedLevel and (isInside or self.displayedRange == self.selectedRange):
+            return
+        span = visibleEnd - visibleStart
+        selectedStart, selectedEnd = self.selectedRange
+        self.showLevel(level, max(selectedStart, visibleStart - span), min(selectedEnd, visibleEnd + span))
+        fromRow, toRow = level.rowRange(visibleStart, visibleEnd)
+        offset = level.rowRange(*self.displayedRange)[0]
+        self.ax.vb.setXRange(fromRow - offset, toRow - offset, padding=0)
+
+    def toggleLive(self, isOn: bool):
+        if isOn:
+            self.startLive()
+        else:
+            self.stopLive()
+
+    def startLive(self):
+        ticker, ok = QtWidgets.QInputDialog.getText(self, 'Live', 'Ticker', text=self.ticker or 'AMD')
+        if not ok or not ticker:
+            self.actionLive.setChecked(False)
+            return
+        self.setFileControlsEnabled(False)
+        self.statusbar.showMessage(f'Connecting for {ticker}')
+        self.liveConnector = LiveConnector(ticker, self.connectLive)
+        self.liveConnector.sig_connected.connect(self.liveConnected)
+        self.liveConnector.sig_failed.connect(self.liveConnectFailed)
+        self.liveConnector.start()
+
+    def connectLive(self, ticker: str):
+        """Runs on the connector thread, :return: connected client and the resolved contract"""
+        # the broker client is only needed in live mode, ibapi does not have to be installed otherwise
+        if HISTDATA_DIRECTORY not in sys.path:
+            sys.path.insert(0, HISTDATA_DIRECTORY)
+        from contracts import ContractCache
+        from histdata import BrokerClient
+
+        client = BrokerClient(*LIVE_CONNECTION, contracts=ContractCache())
+        if not client.lowLevelClient.isConnected():
+            client.disconnect()
+            raise ConnectionError('Cannot connect to client')
+        client.register(print)
+        try:
+            return client, client.buildContract(ticker, 'STK', 'SMART', 'USD')
+        except Exception:
+            client.disconnect()
+            raise
+
+    def liveConnected(self, client, contract):
+        if self.sender() is not self.liveConnector or not self.actionLive.isChecked():
+            # live mode was stopped while connecting
+            client.disconnect()
+            return
+        from live import BarUpdateQueue
+
+        self.liveClient = client
+        self.liveUpdates = BarUpdateQueue()
+        self.liveReqId = client.subscribeLiveBars(contract, LIVE_BAR_SIZE, self.liveUpdates)
+        self.ticker = self.liveConnector.ticker
+        self.liveBars = LiveBars(CANDLE_COLUMNS + list(OVERLAYS))
+        self.quotes = self.liveBars.toFrame()
+        self.quotesTimes = barcache.frameTimes(self.quotes)
+        self.liveIndicators = overlayIndicators()
+        self.esLines.hide()
+        self.touchTracker = TouchTracker(self.priceValue(self.priceLineEdit), self.priceValue(self.stopPriceEdit))
+        self.statusbar.showMessage(f'Live {self.ticker}')
+        self.liveTimer.start()
+
+    def liveConnectFailed(self, message: str):
+        if self.sender() is not self.liveConnector or not self.actionLive.isChecked():
+            return
+        self.statusbar.showMessage(message)
+        self.actionLive.setChecked(False)
+
+    def stopLive(self):
+        self.liveTimer.stop()
+        if self.liveConnector is not None:
+            self.retireThread(self.liveConnector)
+            self.liveConnector = None
+        if self.liveClient is not None:
+            self.liveClient.cancelLiveBars(self.liveReqId)
+            self.liveClient.disconnect()
+            self.liveClient = None
+        self.setFileControlsEnabled(True)
+        self.statusbar.showMessage('')
+
+    def retireThread(self, thread: QtCore.QThread):
+        """Keeps a replaced thread referenced until it is done, the slots ignore what it emits afterwards"""
+        if thread.isRunning():
+            self.retiredThreads.add(thread)
+            thread.finished.connect(self.pruneRetiredThreads)
+
+    def pruneRetiredThreads(self):
+        self.retiredThreads = {thread for thread in self.retiredThreads if not thread.isFinished()}
+
+    def setFileControlsEnabled(self, isEnabled: bool):
+        """The controls showing bars of the file, they are off in live mode"""
+        for control in [self.calculatePushButton, self.previousDayPushButton, self.nextDayPushButton,
+                        self.dayDateEdit, self.daysSpinBox, self.actionOpen]:
+            control.setEnabled(isEnabled)
+
+    def priceValue(self, lineEdit):
+        text = lineEdit.text()
+        return float(text) if text else None
+
+    def updateLive(self):
+        """
+        Applies the coalesced live bars: the forming candle is patched in place and new candles are appended,
+        the overlay indicators are updated incrementally with them
+        """
+        bars = self.liveUpdates.drain()
+        if not bars:
+            return
+        liveBars = self.liveBars
+        firstChangedRow = len(liveBars)
+        for date, open, high, low, close, volume in bars:
+            time = int(date) * 10 ** 9
+            row = liveBars.times.searchsorted(time)
+            isPatch = row < len(liveBars) and liveBars.times[row] == time
+            if not isPatch and row != len(liveBars):
+                continue
+            values = self.liveIndicators.update(row, time, open, high, low, close, float(volume))
+            liveBars.set(row, time, [open, close, high, low, float(volume)] + [values[name] for name in OVERLAYS])
+            firstChangedRow = min(firstChangedRow, row)
+        self.quotes = liveBars.toFrame()
+        self.quotesTimes = barcache.frameTimes(self.quotes)
+
+        if self.candleItems is None or firstChangedRow == 0:
+            # the first live bars replace the bars of the displayed day
+            self.updateCandlePane(self.quotes)
+        else:
+            self.candleItems.update_data(self.quotes)
+            self.redrawOverlays()
+
+        # only the changed bars are re-evaluated against entry and stop prices
+        for row in range(firstChangedRow, len(liveBars)):
+            open, close, high, low = liveBars.bar(row)[:4]
+            if self.touchTracker.update(row, open, high, low, close):
+                self.esLines.drawTrackedTouch(self.quotes, self.touchTracker, row)
+
+    def showPreviousDay(self):
+        if self.dayIndex is None:
+            self.updatePlot()
+        else:
+            self.showDay(self.dayIndex.previousDay(self.dayDateEdit.date().toPyDate()))
+
+    def showNextDay(self):
+        if self.dayIndex is None:
+            self.updatePlot()
+        else:
+            self.showDay(self.dayIndex.nextDay(self.dayDateEdit.date().toPyDate()))
+
+    def showDay(self, day):
+        if day is None:
+            self.statusbar.showMessage('No more records in this direction')
+            return
+        self.dayDateEdit.setDate(day)
+        self.updatePlot()
+
     def calculateDateRange(self):
-        dateTimeFrom = self.dayDateEdit.dateTime().toPyDateTime()
-        dateTimeTo = dateTimeFrom + datetime.timedelta(days=1)
+        return self.dateRange(self.dayDateEdit.date().toPyDate())
+
+    def dateRange(self, day: datetime.date):
+        dateTimeFrom = datetime.datetime.combine(day, datetime.time())
+        dateTimeTo = dateTimeFrom + datetime.timedelta(days=self.daysSpinBox.value())
         start_date = pd.to_datetime(dateTimeFrom, utc=True)
         end_date = pd.to_datetime(dateTimeTo, utc=True)
         return end_date, start_date
 
     def isDfHasDate(self, date: datetime) -> bool:
-        return (self.df['DateTime'].dt.date == date).any()
+        return self.dayIndex.hasDay(date)
 
     def loadData(self, filename: str):
-        df = pd.read_csv(filename, usecols=['DateTime', 'Open', 'High', 'Low', 'Close'], na_values=['nan'])
-        df['DateTime'] = pd.to_datetime(df['DateTime'], utc=True)
-        df.reset_index(inplace=True)
-        return df
+        return barcache.loadFrame(filename, columns=CANDLE_COLUMNS)
+
+    def findQuoteRow(self, x):
+        """
+        Returns the row of the displayed bar covering timestamp x, or None when x is outside of the bars.
+        The last bar is assumed to be as long as the one before it.
+        """
+        times = self.quotesTimes
+        if times is None or len(times) == 0:
+            return None
+        timestamp = pd.Timestamp(x).value
+        row = times.searchsorted(timestamp, side='right') - 1
+        if row < 0:
+            return None
+        if row == len(times) - 1 and len(times) > 1 and timestamp >= 2 * times[-1] - times[-2]:
+            return None
+        return row
 
     def updateLegend(self, x, y):
-        if self.df is not None:
-            row = self.df.loc[self.df['DateTime'] == pd.to_datetime(pd.Timestamp(x).floor('min'), utc=True)]
-            if not row.empty:
-                rawText = '<span style="font-size:13px">%s</span> &nbsp; O %s C %s H %s L %s'
-                ticker = self.filename.split(sep="/")[-1].split(".")[0]
-                self.hoverLabel.setText(rawText % (
-                    ticker, row.Open.values[0], row.Close.values[0], row.High.values[0], row.Low.values[0]))
+        row = self.findQuoteRow(x)
+        if row is not None:
+            rawText = '<span style="font-size:13px">%s</span> &nbsp; O %s C %s H %s L %s V %s &nbsp; VWAP %.2f'
+            quotes = self.quotes
+            self.hoverLabel.setText(rawText % (
+                self.ticker, quotes['Open'].values[row], quotes['Close'].values[row],
+                quotes['High'].values[row], quotes['Low'].values[row], quotes['Volume'].values[row],
+                quotes['VWAP'].values[row]))
 
 
 def main():
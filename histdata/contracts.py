@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from ibapi.contract import Contract as IBcontract
+
+DEFAULT_FILE_NAME = os.path.join(os.path.expanduser('~'), '.histdata', 'contracts.json')
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+ContractKey = Tuple[str, str, str, str]
+
+
+def contractKey(symbol: str, secType: str, exchange: str, currency: str) -> ContractKey:
+    return symbol.upper(), secType.upper(), exchange.upper(), currency.upper()
+
+
+def contractToDict(contract: IBcontract) -> dict:
+    # combo legs and delta neutral contracts are not used for history requests
+    return {name: value for name, value in vars(contract).items() if isinstance(value, (str, int, float, bool))}
+
+
+def contractFromDict(fields: dict) -> IBcontract:
+    contract = IBcontract()
+    for name, value in fields.items():
+        setattr(contract, name, value)
+    return contract
+
+
+class ContractCache:
+    """
+    Resolved contracts saved in a json file and keyed by (symbol, secType, exchange, currency),
+    so a contract is asked from the server once per ttlSeconds instead of once per download.
+    Only contracts with a conId are stored, unresolved ones are asked again next time.
+    One cache can be shared by several client connections.
+    """
+
+    def __init__(self, fileName: str = DEFAULT_FILE_NAME, ttlSeconds: float = DEFAULT_TTL_SECONDS,
+                 clock=time.time):
+        self._fileName = fileName
+        self._ttlSeconds = ttlSeconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = self._read()
+
+    def get(self, key: ContractKey) -> Optional[IBcontract]:
+        with self._lock:
+            entry = self._entries.get(self._name(key))
+        if entry is None or self._clock() - entry['resolvedAt'] > self._ttlSeconds:
+            return None
+        return contractFromDict(entry['contract'])
+
+    def put(self, key: ContractKey, contract: IBcontract):
+        if not contract.conId:
+            return
+        with self._lock:
+            self._entries[self._name(key)] = {'resolvedAt': self._clock(), 'contract': contractToDict(contract)}
+            self._write()
+
+    def invalidate(self, key: ContractKey = None):
+        """Forgets one contract, or every contract when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self._name(key), None)
+            self._write()
+
+    @staticmethod
+    def _name(key: ContractKey) -> str:
+        return '|'.join(key)
+
+    def _read(self) -> dict:
+        try:
+            with open(self._fileName) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        directory = os.path.dirname(self._fileName)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmpFileName = f'{self._fileName}.tmp'
+        with open(tmpFileName, 'w') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmpFileName, self._fileName)
@@ -0,0 +1,283 @@
+"""
+Local stand-in for the IB Gateway, to measure and stress BrokerClient without a logged-in gateway.
+
+FakeBrokerClient is a BrokerClient whose low level client never opens a socket: reqContractDetails and
+reqHistoricalData are answered from local csv files (like ``samples/``) by a FakeGateway, through the same
+_Wrapper callbacks and from a single reader thread, like the real EClient does.
+The gateway can add latency, reject requests over a pacing limit, fail requests with error codes and drop the
+end marker of a request, so timeouts, retries and concurrency can be tested offline.
+"""
+import glob
+import heapq
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from ibapi.common import BarData
+from ibapi.contract import ContractDetails
+
+from histdata import BrokerClient, _Client, _Wrapper, DEFAULT_CONCURRENT_REQUESTS
+from pacing import PacingScheduler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from backtest import barcache
+
+NO_SECURITY_CODE = 200
+HISTORICAL_DATA_ERROR_CODE = 162
+NO_SECURITY_MESSAGE = "No security definition has been found for the request"
+PACING_VIOLATION_MESSAGE = "Historical Market Data Service error message:Historical data request pacing violation"
+NO_DATA_MESSAGE = "Historical Market Data Service error message:HMDS query returned no data: " \
+                  "{symbol}@{exchange} Trades"
+DEFAULT_ERRORS = (
+    (HISTORICAL_DATA_ERROR_CODE, "Historical Market Data Service error message:API historical data query cancelled"),
+    (322, "Error processing request:-'bW' : cause - Duplicate ticker id"),
+    (366, "No historical data query found for ticker id"),
+)
+DURATION_UNITS = {'S': 'seconds', 'D': 'days', 'W': 'weeks', 'M': 'months', 'Y': 'years'}
+TIME_FORMAT = "%Y%m%d %H:%M:%S"
+
+
+@dataclass
+class GatewayBehaviour:
+    """
+    :param latency: seconds before the answer of a request starts
+    :param jitter: extra latency, uniformly distributed in [0, jitter)
+    :param pacingLimit: (requests, seconds), historical requests over it fail like on the real gateway,
+        which allows (60, 600)
+    :param errorRate: share of historical requests failed with one of errors
+    :param dropEndRate: share of historical requests answered without the end marker
+    :param seed: seed of the random choices, None for a different run every time
+    :param timezone: timezone of end date times without one, the timezone of the gateway login
+    """
+    latency: float = 0.05
+    jitter: float = 0.0
+    pacingLimit: Optional[Tuple[int, float]] = None
+    errorRate: float = 0.0
+    errors: Sequence[Tuple[int, str]] = DEFAULT_ERRORS
+    dropEndRate: float = 0.0
+    seed: Optional[int] = 0
+    timezone: str = 'US/Eastern'
+
+
+class FakeGateway:
+    """
+    Serves contracts and bars of csv files, one file per symbol. The bars are served as they are in the file
+    whatever the requested bar size. One gateway can be shared by several clients, the pacing limit is counted
+    across all of them as on a real gateway.
+    """
+
+    def __init__(self, files: Dict[str, str], behaviour: GatewayBehaviour = None):
+        self.files = {symbol.upper(): fileName for symbol, fileName in files.items()}
+        self.behaviour = behaviour if behaviour is not None else GatewayBehaviour()
+        self.stats = Counter()
+        self._random = random.Random(self.behaviour.seed)
+        self._lock = threading.Lock()
+        self._requestTimes = deque()
+        self._bars = {}
+
+    @classmethod
+    def fromDirectory(cls, directory: str, behaviour: GatewayBehaviour = None) -> 'FakeGateway':
+        """Serves files named ``<symbol>_*.csv`` like in samples/, the first one by name for every symbol"""
+        files = {}
+        for fileName in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+            files.setdefault(os.path.basename(fileName).split('_')[0].upper(), fileName)
+        return cls(files, behaviour)
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.behaviour.latency + self._random.random() * self.behaviour.jitter
+
+    def contractDetails(self, contract) -> Optional[ContractDetails]:
+        self._count('contractDetails')
+        symbol = contract.symbol.upper()
+        if symbol not in self.files:
+            return None
+        details = ContractDetails()
+        details.contract.symbol = symbol
+        details.contract.secType = contract.secType
+        details.contract.exchange = contract.exchange
+        details.contract.currency = contract.currency
+        details.contract.conId = zlib.crc32(symbol.encode()) & 0x7fffffff
+        return details
+
+    def historicalData(self, contract, endDateTime: str, durationStr: str, formatDate: int):
+        """
+        :return: (bars, None, dropEnd) or (None, (error code, message), False)
+        """
+        self._count('historicalData')
+        symbol = contract.symbol.upper()
+        if symbol not in self.files:
+            self._count('errors')
+            return None, (NO_SECURITY_CODE, NO_SECURITY_MESSAGE), False
+        error = self._pacingViolation() or self._randomError()
+        if error is not None:
+            self._count('errors')
+            return None, error, False
+
+        bars = self._select(symbol, endDateTime, durationStr, formatDate)
+        if not bars:
+            self._count('noData')
+            return None, (HISTORICAL_DATA_ERROR_CODE,
+                          NO_DATA_MESSAGE.format(symbol=symbol, exchange=contract.exchange)), False
+        with self._lock:
+            dropEnd = self._random.random() < self.behaviour.dropEndRate
+            self.stats['bars'] += len(bars)
+            self.stats['droppedEnds'] += dropEnd
+        return bars, None, dropEnd
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _pacingViolation(self):
+        if self.behaviour.pacingLimit is None:
+            return None
+        maxRequests, seconds = self.behaviour.pacingLimit
+        now = time.monotonic()
+        with self._lock:
+            while self._requestTimes and self._requestTimes[0] <= now - seconds:
+                self._requestTimes.popleft()
+            if len(self._requestTimes) >= maxRequests:
+                self.stats['pacingViolations'] += 1
+                return HISTORICAL_DATA_ERROR_CODE, PACING_VIOLATION_MESSAGE
+            self._requestTimes.append(now)
+        return None
+
+    def _randomError(self):
+        with self._lock:
+            if self._random.random() < self.behaviour.errorRate:
+                return self._random.choice(self.behaviour.errors)
+        return None
+
+    def _select(self, symbol: str, endDateTime: str, durationStr: str, formatDate: int):
+        bars = self.loadBars(symbol)
+        end = self._parseEnd(endDateTime)
+        count, unit = durationStr.split()
+        start = end - relativedelta(**{DURATION_UNITS[unit]: int(count)})
+        rows = slice(*np.searchsorted(bars.times, [start.value, end.value]))
+        if formatDate == 1:
+            texts = barcache.timesToIndex(bars.times[rows], self.behaviour.timezone).strftime(TIME_FORMAT)
+        else:
+            texts = (bars.times[rows] // 10 ** 9).astype(str)
+        return [self._bar(text, *values) for text, values in zip(texts, zip(
+            bars.open[rows].tolist(), bars.high[rows].tolist(), bars.low[rows].tolist(), bars.close[rows].tolist(),
+            bars.volume[rows].tolist()))]
+
+    def loadBars(self, symbol: str) -> barcache.BarArrays:
+        with self._lock:
+            bars = self._bars.get(symbol)
+            if bars is None:
+                bars = self._bars[symbol] = barcache.loadBars(self.files[symbol])
+        return bars
+
+    def _parseEnd(self, endDateTime: str) -> pd.Timestamp:
+        parts = endDateTime.split()
+        if not parts:
+            return pd.Timestamp.now(tz='UTC')
+        timezone = parts[2] if len(parts) > 2 else self.behaviour.timezone
+        return pd.Timestamp(datetime.strptime(' '.join(parts[:2]), TIME_FORMAT)).tz_localize(timezone).tz_convert('UTC')
+
+    @staticmethod
+    def _bar(date, open, high, low, close, volume) -> BarData:
+        bar = BarData()
+        bar.date = date
+        bar.open = open
+        bar.high = high
+        bar.low = low
+        bar.close = close
+        bar.volume = volume
+        return bar
+
+
+class FakeClient(_Client):
+    """_Client answering from a FakeGateway, the answers are dispatched by run() like by the EReader thread"""
+
+    def __init__(self, wrapper: _Wrapper, gateway: FakeGateway):
+        _Client.__init__(self, wrapper)
+        self._gateway = gateway
+        self._condition = threading.Condition()
+        self._events = []
+        self._sequence = itertools.count()
+        self._cancelled = set()
+        self._connected = False
+
+    def connect(self, host, port, clientId):
+        self.clientId = clientId
+        self._connected = True
+
+    def isConnected(self):
+        return self._connected
+
+    def disconnect(self):
+        with self._condition:
+            self._connected = False
+            self._condition.notify_all()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._connected and (not self._events or self._events[0][0] > time.monotonic()):
+                    timeout = self._events[0][0] - time.monotonic() if self._events else None
+                    self._condition.wait(timeout)
+                if not self._connected:
+                    return
+                _, _, event = heapq.heappop(self._events)
+            event()
+
+    def reqContractDetails(self, reqId, contract):
+        def answer():
+            details = self._gateway.contractDetails(contract)
+            if details is None:
+                self.wrapper.error(reqId, NO_SECURITY_CODE, NO_SECURITY_MESSAGE)
+                return
+            self.wrapper.contractDetails(reqId, details)
+            self.wrapper.contractDetailsEnd(reqId)
+
+        self._schedule(answer)
+
+    def reqHistoricalData(self, reqId, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH,
+                          formatDate, keepUpToDate, chartOptions):
+        self._cancelled.discard(reqId)
+        bars, error, dropEnd = self._gateway.historicalData(contract, endDateTime, durationStr, formatDate)
+
+        def answer():
+            if reqId in self._cancelled:
+                return
+            if error is not None:
+                self.wrapper.error(reqId, *error)
+                return
+            for bar in bars:
+                self.wrapper.historicalData(reqId, bar)
+            if not dropEnd:
+                self.wrapper.historicalDataEnd(reqId, bars[0].date, bars[-1].date)
+
+        self._schedule(answer)
+
+    def cancelHistoricalData(self, reqId):
+        self._cancelled.add(reqId)
+
+    def _schedule(self, event):
+        with self._condition:
+            heapq.heappush(self._events, (time.monotonic() + self._gateway.delay(), next(self._sequence), event))
+            self._condition.notify_all()
+
+
+class FakeBrokerClient(BrokerClient):
+    def __init__(self, gateway: FakeGateway, clientId: int = 1, pacing: PacingScheduler = None,
+                 concurrentRequests: int = DEFAULT_CONCURRENT_REQUESTS, contracts=None):
+        self._gateway = gateway
+        BrokerClient.__init__(self, 'fake', 0, clientId, pacing, concurrentRequests, contracts)
+
+    def _createClient(self, wrapper: _Wrapper) -> _Client:
+        return FakeClient(wrapper, self._gateway)
@@ -0,0 +1,65 @@
+import os
+import sys
+from datetime import timedelta
+
+from histdata import BrokerClient, RequestError
+from jobs import DownloadJob
+from sinks import FetchSummary
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from backtest.store import BarStore
+
+
+class GapFiller:
+    """
+    Downloads only the days a store is missing for a contract and bar size and merges them into the store
+    """
+
+    def __init__(self, client: BrokerClient, store: BarStore):
+        self._client = client
+        self._store = store
+
+    def fill(self, contract, ticker: str, fromDate, endDate, barSize: str) -> FetchSummary:
+        """
+        :return: summary of the downloaded bars, fileName is the store file
+        :raises RequestError: when some ranges failed, after the other ones are merged; the failed ones stay
+            missing and the next fill requests them again
+        """
+        summary = FetchSummary(self._store.path(ticker, barSize))
+        ranges = self._store.missingRanges(ticker, barSize, fromDate, endDate)
+        if not ranges:
+            self._client.notify(f"{ticker} {barSize} is up to date in {self._store.directory}")
+            return summary
+
+        missingDays = sum((rangeEnd - rangeFrom).days for rangeFrom, rangeEnd in ranges)
+        self._client.notify(f"Requesting {len(ranges)} missing range(s), {missingDays} day(s)")
+        os.makedirs(self._store.directory, exist_ok=True)
+        failed = []
+        for rangeFrom, rangeEnd in ranges:
+            # every range has its own download file, so a failed one is resumed by the next fill
+            downloadFileName = f'{summary.fileName}.{rangeFrom:%Y%m%d}-{rangeEnd:%Y%m%d}.download'
+            try:
+                rangeSummary = DownloadJob(self._client, contract, rangeFrom, rangeEnd, barSize,
+                                           downloadFileName).run()
+            except RequestError as e:
+                # its days are not marked as checked, they stay missing
+                failed.append(f"{rangeFrom} - {rangeEnd}: {e}")
+                continue
+            if rangeSummary.bars:
+                self._store.mergeFile(ticker, barSize, downloadFileName)
+                os.remove(downloadFileName)
+            self._store.markChecked(ticker, barSize, self._completedDays(rangeFrom, rangeEnd))
+            summary.bars += rangeSummary.bars
+            summary.chunks += rangeSummary.chunks
+            summary.firstDateTime = summary.firstDateTime or rangeSummary.firstDateTime
+            summary.lastDateTime = rangeSummary.lastDateTime or summary.lastDateTime
+        self._client.notify(f"{summary.bars} bars merged into {summary.fileName}")
+        if failed:
+            raise RequestError(f"{len(failed)} of {len(ranges)} range(s) failed, they are requested again by the "
+                               f"next fill: " + "; ".join(failed))
+        return summary
+
+    def _completedDays(self, rangeFrom, rangeEnd):
+        today = type(rangeFrom).today()
+        days = [rangeFrom + timedelta(days=offset) for offset in range((rangeEnd - rangeFrom).days)]
+        return [day for day in days if day < today]
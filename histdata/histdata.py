@@ -1,4 +1,9 @@
+import asyncio
+import itertools
 import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime, date
 from threading import Thread
@@ -10,14 +15,32 @@ from ibapi.client import EClient
 from ibapi.contract import Contract as IBcontract
 from ibapi.wrapper import EWrapper
 
+from contracts import ContractCache, contractKey
+from metrics import RequestStarted, RequestFinished, PacingWait, PacingDelay, QuietEvent, MetricsAggregator, \
+    HISTORICAL_DATA, CONTRACT_DETAILS
+from pacing import PacingScheduler
+
 DEFAULT_HISTORIC_DATA_ID = 50
 DEFAULT_GET_CONTRACT_ID = 43
+DEFAULT_CONCURRENT_REQUESTS = 5
+CONCURRENT_CONTRACT_REQUESTS = 20
+WHAT_TO_SHOW = "TRADES"
 
 FINISHED = object()
 STARTED = object()
 TIME_OUT = object()
+ERROR = object()
 
 MAX_WAIT_SECONDS = 30
+LIVE_HISTORY_DURATION = "1 D"
+CONTRACT_DETAILS_WAIT_SECONDS = 10
+# shorter pacing waits are only counted by the metrics, longer ones are also logged
+PACING_NOTICE_SECONDS = 1
+
+# 2100-2199 are warnings and notices like data farm connection status, not request failures
+WARNING_CODES_FROM = 2100
+WARNING_CODES_TO = 2199
+NO_DATA_MESSAGE = "returned no data"
 
 
 @dataclass
@@ -31,45 +54,106 @@ class Observable:
         self.observers.remove(observer)
 
     def notify(self, *args, **kwargs):
+        isQuiet = bool(args) and isinstance(args[0], QuietEvent)
         for observer in self.observers:
+            if isQuiet and not getattr(observer, 'receivesQuietEvents', False):
+                continue
             observer(*args, **kwargs)
 
 
+class RequestError(Exception):
+    pass
+
+
 class _FinishableQueue(object):
-    def __init__(self, queue_to_finish):
-        self._queue = queue_to_finish
+    """
+    Collects the answers of one request. The wrapper thread puts elements into it and finishes it on the
+    request end marker or on an error scoped to its reqId, readers wait on an event that is set right then.
+    """
+
+    def __init__(self):
+        self._contents = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._callbacks = []
         self.status = STARTED
+        self.errors = []
+        self.span = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._contents)
+
+    def put(self, element):
+        with self._lock:
+            self._contents.append(element)
+
+    def finish(self, status=FINISHED):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.status = status
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def fail(self, error: str):
+        with self._lock:
+            self.errors.append(error)
+        self.finish(ERROR)
 
     def get(self, timeout):
         """
-        Returns a list of queue elements once timeout is finished, or a FINISHED flag is received in the queue
+        Returns the collected elements as soon as the request is finished or failed, or once timeout is over
 
         :param timeout: how long to wait before giving up
-        :return: list of queue elements
+        :return: list of elements
+        """
+        if not self._done.wait(timeout):
+            self.finish(TIME_OUT)
+        with self._lock:
+            return list(self._contents)
+
+    def addDoneCallback(self, callback: Callable):
+        """Calls callback(queue) from the thread finishing the request, right away when it is already finished"""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def asFuture(self, loop: asyncio.AbstractEventLoop) -> asyncio.Future:
         """
-        contents_of_queue = []
-        finished = False
+        :return: future of the given loop resolved with the elements, or with RequestError if the request failed
+        """
+        future = loop.create_future()
+        self.addDoneCallback(lambda _: loop.call_soon_threadsafe(self._resolveFuture, future))
+        return future
+
+    def _resolveFuture(self, future: asyncio.Future):
+        if future.done():
+            return
+        if self.failed():
+            future.set_exception(RequestError("; ".join(self.errors)))
+        else:
+            with self._lock:
+                future.set_result(list(self._contents))
 
-        while not finished:
-            try:
-                current_element = self._queue.get(timeout=timeout)
-                if current_element is FINISHED:
-                    finished = True
-                    self.status = FINISHED
-                else:
-                    contents_of_queue.append(current_element)
-                    # keep going and try and get more data
+    def timed_out(self):
+        return self.status is TIME_OUT
 
-            except queue.Empty:
-                # If we hit a time out it's most probable we're not getting a finished element any time soon
-                # give up and return what we have
-                finished = True
-                self.status = TIME_OUT
+    def failed(self):
+        return self.status is ERROR
 
-        return contents_of_queue
 
-    def timed_out(self):
-        return self.status is TIME_OUT
+def isNoData(request: _FinishableQueue) -> bool:
+    """Whether a historical data request failed only because the range has no bars, e.g. a holiday"""
+    return bool(request.errors) and all(NO_DATA_MESSAGE in error for error in request.errors)
+
+
+def isWarning(errorCode: int) -> bool:
+    return WARNING_CODES_FROM <= errorCode <= WARNING_CODES_TO
 
 
 class _Wrapper(EWrapper):
@@ -81,8 +165,9 @@ class _Wrapper(EWrapper):
 
     def __init__(self):
         super().__init__()
-        self._contractDetails = {}
-        self._historicDataDict = {}
+        self._requests = {}
+        self._requestsLock = threading.Lock()
+        self._updateHandlers = {}
         self.initError()
 
     # error handling code
@@ -103,41 +188,70 @@ class _Wrapper(EWrapper):
         an_error_if = not self._errorQueue.empty()
         return an_error_if
 
-    def error(self, id, errorCode, errorString):
+    def error(self, id, errorCode, errorString, *args):
         errorMsg = "IB error id %d error code %d string %s" % (id, errorCode, errorString)
-        self._errorQueue.put(errorMsg)
+        request = self._requests.get(id)
+        if request is not None and not isWarning(errorCode):
+            # only the request it belongs to is failed, others keep running
+            request.fail(errorMsg)
+        else:
+            self._errorQueue.put(errorMsg)
+
+    # requests book keeping
+    def initRequest(self, reqId) -> _FinishableQueue:
+        with self._requestsLock:
+            request = self._requests[reqId] = _FinishableQueue()
+        return request
+
+    def releaseRequest(self, reqId):
+        with self._requestsLock:
+            self._requests.pop(reqId, None)
+
+    def _put(self, reqId, element):
+        # answers arriving after the request was released, e.g. once it timed out, are dropped
+        request = self._requests.get(reqId)
+        if request is not None:
+            request.put(element)
+
+    def _finish(self, reqId):
+        request = self._requests.get(reqId)
+        if request is not None:
+            request.finish()
 
     # get contract details code
     def initContractDetails(self, reqId):
-        contract_details_queue = self._contractDetails[reqId] = queue.Queue()
-        return contract_details_queue
+        return self.initRequest(reqId)
 
     def contractDetails(self, reqId, contractDetails):
-        if reqId not in self._contractDetails.keys():
-            self.initContractDetails(reqId)
-        self._contractDetails[reqId].put(contractDetails)
+        self._put(reqId, contractDetails)
 
     def contractDetailsEnd(self, reqId):
-        if reqId not in self._contractDetails.keys():
-            self.initContractDetails(reqId)
-        self._contractDetails[reqId].put(FINISHED)
+        self._finish(reqId)
 
     def initHistoricPriceQueue(self, tickerId):
-        historic_data_queue = self._historicDataDict[tickerId] = queue.Queue()
-        return historic_data_queue
+        return self.initRequest(tickerId)
 
     def historicalData(self, tickerId, bar):
-        barData = (bar.date, bar.open, bar.high, bar.low, bar.close, bar.volume)
-        historic_data_dict = self._historicDataDict
-
-        if tickerId not in historic_data_dict.keys():
-            self.initHistoricPriceQueue(tickerId)
-        historic_data_dict[tickerId].put(barData)
+        self._put(tickerId, _barData(bar))
 
     def historicalDataEnd(self, tickerId, start: str, end: str):
-        if tickerId not in self._historicDataDict.keys():
-            self.initHistoricPriceQueue(tickerId)
-        self._historicDataDict[tickerId].put(FINISHED)
+        self._finish(tickerId)
+
+    # keepUpToDate subscriptions
+    def setUpdateHandler(self, reqId, handler: Callable):
+        self._updateHandlers[reqId] = handler
+
+    def removeUpdateHandler(self, reqId):
+        self._updateHandlers.pop(reqId, None)
+
+    def historicalDataUpdate(self, reqId, bar):
+        handler = self._updateHandlers.get(reqId)
+        if handler is not None:
+            handler(_barData(bar))
+
+
+def _barData(bar):
+    return bar.date, bar.open, bar.high, bar.low, bar.close, bar.volume
 
 
 class _Client(EClient, Observable):
@@ -145,6 +259,13 @@ class _Client(EClient, Observable):
         EClient.__init__(self, wrapper)
         Observable.__init__(self)
 
+    def requestContractDetails(self, ibContract, reqId=DEFAULT_GET_CONTRACT_ID) -> _FinishableQueue:
+        request = self.wrapper.initContractDetails(reqId)
+        self.notify("Getting full contract details from the server... ")
+        self._startSpan(request, RequestStarted(reqId, CONTRACT_DETAILS))
+        self.reqContractDetails(reqId, ibContract)
+        return request
+
     def resolveContract(self, ibContract, reqId=DEFAULT_GET_CONTRACT_ID):
 
         """
@@ -153,22 +274,19 @@ class _Client(EClient, Observable):
         :returns fully resolved IB contract
         """
 
-        # Make a place to store the data we're going to return
-        contract_details_queue = _FinishableQueue(self.wrapper.initContractDetails(reqId))
-
-        self.notify("Getting full contract details from the server... ")
-
-        self.reqContractDetails(reqId, ibContract)
+        request = self.requestContractDetails(ibContract, reqId)
 
-        ## Run until we get a valid contract(s) or get bored waiting
-        MAX_WAIT_SECONDS = 10
-        new_contract_details = contract_details_queue.get(timeout=MAX_WAIT_SECONDS)
+        ## Run until we get a valid contract(s), an error or get bored waiting
+        new_contract_details = request.get(timeout=CONTRACT_DETAILS_WAIT_SECONDS)
+        return self.finishContractDetails(request, reqId, ibContract, new_contract_details)
 
-        while self.wrapper.isError():
-            self.notify(self.wrapper.getError())
+    def finishContractDetails(self, request, reqId, ibContract, new_contract_details):
+        self.wrapper.releaseRequest(reqId)
+        self.notifyErrors(request)
+        self.finishSpan(request)
 
-        if contract_details_queue.timed_out():
-            self.notify("Exceeded maximum wait for wrapper to confirm finished - seems to be normal behaviour")
+        if request.timed_out():
+            self.notify("Exceeded maximum wait of %d seconds for contract details" % CONTRACT_DETAILS_WAIT_SECONDS)
 
         if len(new_contract_details) == 0:
             self.notify("Failed to get additional contract details: returning unresolved contract")
@@ -181,64 +299,195 @@ class _Client(EClient, Observable):
         resolved_ibcontract = new_contract_details.contract
         return resolved_ibcontract
 
-    def fetchHistoricalData(self, ibContract, endDataTime=datetime.today().strftime("%Y%m%d %H:%M:%S %Z"),
-                            durationStr="1 Y", barSizeSetting="1 day", tickerId=DEFAULT_HISTORIC_DATA_ID):
-
+    def requestHistoricalData(self, ibContract, endDataTime, durationStr, barSizeSetting,
+                              tickerId=DEFAULT_HISTORIC_DATA_ID, keepUpToDate=False) -> _FinishableQueue:
         # Make a place to store the data we're going to return
-        historic_data_queue = _FinishableQueue(self.wrapper.initHistoricPriceQueue(tickerId))
+        request = self.wrapper.initHistoricPriceQueue(tickerId)
+        self._startSpan(request, RequestStarted(tickerId, HISTORICAL_DATA, endDataTime, durationStr, barSizeSetting))
         self.reqHistoricalData(
             tickerId,  # reqId,
             ibContract,  # contract,
             endDataTime,  # endDateTime,
             durationStr,  # durationStr,
             barSizeSetting,  # barSizeSetting,
-            "TRADES",  # whatToShow,
+            WHAT_TO_SHOW,  # whatToShow,
             1,  # useRTH,
             2,  # formatDate
-            False,  # KeepUpToDate <<==== added for api 9.73.2
+            keepUpToDate,  # KeepUpToDate <<==== added for api 9.73.2
             []  # chartoptions not used
         )
+        self.notify("Getting historical data from the server... ")
+        return request
 
-        # Wait until we get a completed data, an error, or get bored waiting
-        self.notify("Getting historical data from the server... could take %d seconds to complete " % MAX_WAIT_SECONDS)
+    def fetchHistoricalData(self, ibContract, endDataTime=datetime.today().strftime("%Y%m%d %H:%M:%S %Z"),
+                            durationStr="1 Y", barSizeSetting="1 day", tickerId=DEFAULT_HISTORIC_DATA_ID):
 
-        historic_data = historic_data_queue.get(timeout=MAX_WAIT_SECONDS)
+        request = self.requestHistoricalData(ibContract, endDataTime, durationStr, barSizeSetting, tickerId)
 
-        cancelTask = False
-        while self.wrapper.isError():
-            self.notify(self.wrapper.getError())
-            cancelTask = True
+        # Wait until we get a completed data, an error, or get bored waiting
+        historic_data = request.get(timeout=MAX_WAIT_SECONDS)
+        self.finishHistoricalData(request, tickerId)
+        return historic_data
 
-        if historic_data_queue.timed_out():
-            self.notify("Exceeded maximum wait for wrapper to confirm finished - seems to be normal behaviour")
-            cancelTask = True
+    def finishHistoricalData(self, request, tickerId):
+        self.wrapper.releaseRequest(tickerId)
+        self.notifyErrors(request)
+        self.finishSpan(request)
 
-        if cancelTask:
+        if request.timed_out():
+            self.notify("Exceeded maximum wait of %d seconds for historical data, request %d is cancelled"
+                        % (MAX_WAIT_SECONDS, tickerId))
             self.cancelHistoricalData(tickerId)
 
-        return historic_data
+    def _startSpan(self, request, started: RequestStarted):
+        request.span = started
+        self.notify(started)
+
+    def finishSpan(self, request):
+        """Reports the RequestFinished event of a request started by requestHistoricalData or requestContractDetails"""
+        self.notify(RequestFinished.of(request.span, len(request), request.timed_out(), request.failed(),
+                                       "; ".join(map(str, request.errors)) or None))
+
+    def notifyErrors(self, request):
+        for error in request.errors:
+            self.notify(error)
+
+        while self.wrapper.isError():
+            self.notify(self.wrapper.getError())
 
 
 class BrokerClient(Observable):
-    def __init__(self, ipaddress: str, port: int, clientId: int):
+    def __init__(self, ipaddress: str, port: int, clientId: int, pacing: PacingScheduler = None,
+                 concurrentRequests: int = DEFAULT_CONCURRENT_REQUESTS, contracts: ContractCache = None):
+        """
+        :param pacing: pacing scheduler, pass the same one to clients that share the gateway
+        :param concurrentRequests: how many historical data requests are kept in flight at once
+        :param contracts: cache of resolved contracts, without it every buildContract asks the server
+        """
         Observable.__init__(self)
         self._wrapper = _Wrapper()
-        self._client = _Client(wrapper=self._wrapper)
+        self._client = self._createClient(self._wrapper)
+        self._pacing = pacing if pacing is not None else PacingScheduler()
+        self._contracts = contracts
+        self._concurrentRequests = concurrentRequests
+        self._requestIds = itertools.count(DEFAULT_HISTORIC_DATA_ID)
         self.connect(ipaddress, port, clientId)
 
+    def _createClient(self, wrapper: _Wrapper) -> _Client:
+        return _Client(wrapper=wrapper)
+
     @property
     def lowLevelClient(self):
         return self._client
 
     def buildContract(self, symbol: str, secType: str, exchange: str, currency: str):
+        key = contractKey(symbol, secType, exchange, currency)
+        contract = self._cachedContract(key)
+        if contract is None:
+            contract = self._client.resolveContract(self.makeContract(symbol, secType, exchange, currency))
+            self._cacheContract(key, contract)
+        return contract
+
+    def buildContracts(self, specs) -> list:
+        """
+        Resolves many contracts at once, only the ones missing from the cache are asked from the server
+        and those requests are sent concurrently
+
+        :param specs: (symbol, secType, exchange, currency) tuples
+        :return: contracts in the order of specs
+        """
+        async def buildAll():
+            semaphore = asyncio.Semaphore(CONCURRENT_CONTRACT_REQUESTS)
+
+            async def build(spec):
+                async with semaphore:
+                    return await self.buildContractAsync(*spec)
+
+            return await asyncio.gather(*[build(spec) for spec in specs])
+
+        return asyncio.run(buildAll())
+
+    def _cachedContract(self, key):
+        if self._contracts is None:
+            return None
+        contract = self._contracts.get(key)
+        if contract is not None:
+            self.notify(f"Contract {contract.symbol} {contract.conId} is taken from the cache")
+        return contract
+
+    def _cacheContract(self, key, contract):
+        if self._contracts is not None:
+            self._contracts.put(key, contract)
+
+    def makeContract(self, symbol: str, secType: str, exchange: str, currency: str):
         contract = IBcontract()
         contract.symbol = symbol
         contract.secType = secType
         contract.exchange = exchange
         contract.currency = currency
-        return self._client.resolveContract(contract)
+        return contract
+
+    async def buildContractAsync(self, symbol: str, secType: str, exchange: str, currency: str):
+        key = contractKey(symbol, secType, exchange, currency)
+        cached = self._cachedContract(key)
+        if cached is not None:
+            return cached
+        contract = self.makeContract(symbol, secType, exchange, currency)
+        reqId = next(self._requestIds)
+        request = self._client.requestContractDetails(contract, reqId)
+        try:
+            details = await asyncio.wait_for(request.asFuture(asyncio.get_running_loop()),
+                                             CONTRACT_DETAILS_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            request.finish(TIME_OUT)
+            details = request.get(0)
+        except RequestError:
+            details = []
+        contract = self._client.finishContractDetails(request, reqId, contract, details)
+        self._cacheContract(key, contract)
+        return contract
 
     def fetchHistoricalData(self, contract, fromDate, endDate, barSizeSetting):
+        historicData = []
+        for data in self.iterHistoricalData(contract, fromDate, endDate, barSizeSetting):
+            historicData += data
+        return historicData
+
+    def iterHistoricalData(self, contract, fromDate, endDate, barSizeSetting):
+        """
+        Yields the bars of every chunk in chronological order. Requests run concurrently under distinct reqIds,
+        at most concurrentRequests chunks are in flight or waiting to be yielded.
+        """
+        for _, data in self.iterChunks(contract, self.splitIntoChunks(fromDate, endDate), barSizeSetting):
+            yield data
+
+    def iterChunks(self, contract, chunks, barSizeSetting, fetch: Callable = None):
+        """
+        Yields (chunk, bars) for the given (endDateStr, durationStr) chunks in their order, fetched concurrently
+        like in iterHistoricalData
+
+        :param fetch: fetch(contract, endDateStr, durationStr, barSizeSetting) -> bars, _fetchChunk by default.
+            An exception raised by it comes out when its chunk is due, the chunks after it are then cancelled.
+        """
+        fetch = fetch or self._fetchChunk
+        chunks = deque(chunks)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self._concurrentRequests) as pool:
+            try:
+                while chunks or pending:
+                    while chunks and len(pending) < self._concurrentRequests:
+                        chunk = chunks.popleft()
+                        pending.append((chunk, pool.submit(fetch, contract, *chunk, barSizeSetting)))
+                    chunk, future = pending.popleft()
+                    yield chunk, future.result()
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def splitIntoChunks(self, fromDate, endDate):
+        """
+        :return: chronologically ordered list of (endDateStr, durationStr) requests covering the dates
+        """
         timeFormat = "%Y%m%d %H:%M:%S %Z"
         dateDuration = endDate - fromDate
         chunks = []
@@ -257,16 +506,40 @@ class BrokerClient(Observable):
                 daysCount -= month.days
                 if daysCount <= 0:
                     break
-        historicData = []
-        counter = 1
         chunks.reverse()
-        for endDateStr, durationStr in chunks:
-            self.notify(endDateStr)
-            data = self._client.fetchHistoricalData(contract, endDataTime=endDateStr, durationStr=durationStr,
-                                                    barSizeSetting=barSizeSetting, tickerId=counter)
-            historicData += data
-            counter = counter + 1
-        return historicData
+        return chunks
+
+    def _fetchChunk(self, contract, endDateStr, durationStr, barSizeSetting):
+        self._acquirePacing(contract, endDateStr, durationStr, barSizeSetting)
+        self.notify(endDateStr)
+        return self._client.fetchHistoricalData(contract, endDataTime=endDateStr, durationStr=durationStr,
+                                                barSizeSetting=barSizeSetting, tickerId=next(self._requestIds))
+
+    def fetchChunkChecked(self, contract, endDateStr, durationStr, barSizeSetting):
+        """
+        Same as _fetchChunk but raises RequestError when the request timed out or failed,
+        instead of returning the bars received so far. A chunk without any bars is not a failure.
+        """
+        self._acquirePacing(contract, endDateStr, durationStr, barSizeSetting)
+        self.notify(endDateStr)
+        tickerId = next(self._requestIds)
+        request = self._client.requestHistoricalData(contract, endDateStr, durationStr, barSizeSetting, tickerId)
+        data = request.get(timeout=MAX_WAIT_SECONDS)
+        self._client.finishHistoricalData(request, tickerId)
+        if request.timed_out():
+            raise RequestError(f"No answer within {MAX_WAIT_SECONDS} seconds")
+        if request.failed() and not isNoData(request):
+            raise RequestError("; ".join(request.errors))
+        return data
+
+    def _acquirePacing(self, contract, endDateStr, durationStr, barSizeSetting):
+        contractKey = (contract.conId or contract.symbol, contract.secType, contract.exchange, WHAT_TO_SHOW)
+        requestKey = contractKey + (endDateStr, durationStr, barSizeSetting)
+        waited = self._pacing.acquire(requestKey, contractKey)
+        if waited > 0:
+            self.notify(PacingDelay(waited))
+        if waited > PACING_NOTICE_SECONDS:
+            self.notify(PacingWait(waited))
 
     def connect(self, ipaddress: str, port: int, clientId: int):
         self._client.connect(ipaddress, port, clientId)
@@ -279,9 +552,41 @@ class BrokerClient(Observable):
         if self._client:
             self._client.disconnect()
 
-    def saveAsCsv(self, historicData, tickerName):
+    def subscribeLiveBars(self, contract, barSizeSetting, updates, durationStr=LIVE_HISTORY_DURATION) -> int:
+        """
+        Streams bars of a contract into updates, a BarUpdateQueue: the bars of the last durationStr first and then
+        every update of the current bar as the gateway sends it
+
+        :return: reqId of the subscription, pass it to cancelLiveBars
+        """
+        tickerId = next(self._requestIds)
+        self._wrapper.setUpdateHandler(tickerId, updates.put)
+        request = self._client.requestHistoricalData(contract, "", durationStr, barSizeSetting, tickerId,
+                                                     keepUpToDate=True)
+
+        def onHistoryEnd(finished):
+            # runs on the wrapper thread before any update of the subscription is dispatched
+            self._wrapper.releaseRequest(tickerId)
+            self._client.notifyErrors(finished)
+            self._client.finishSpan(finished)
+            updates.putAll(finished.get(0))
+
+        request.addDoneCallback(onHistoryEnd)
+        return tickerId
+
+    def cancelLiveBars(self, tickerId):
+        self._wrapper.removeUpdateHandler(tickerId)
+        self._client.cancelHistoricalData(tickerId)
+
+    def toDataFrame(self, historicData):
         df = pandas.DataFrame(historicData, columns=['DateTime', 'Open', 'High', 'Low', 'Close', 'Volume'])
-        df['DateTime'] = pandas.to_datetime(df['DateTime'], unit='s').dt.tz_localize('UTC').dt.tz_convert('US/Eastern')
+        # formatDate 2 gives epoch seconds as text
+        df['DateTime'] = pandas.to_datetime(pandas.to_numeric(df['DateTime']), unit='s') \
+            .dt.tz_localize('UTC').dt.tz_convert('US/Eastern')
+        return df
+
+    def saveAsCsv(self, historicData, tickerName):
+        df = self.toDataFrame(historicData)
         df.to_csv(f'{tickerName}.csv')
         self.notify(f'Data has been saved as {tickerName}.csv')
 
@@ -295,11 +600,16 @@ class BrokerClient(Observable):
 
 
 if __name__ == '__main__':
-    app = BrokerClient("127.0.0.1", 4001, 2)
+    from jobs import DownloadJob
+
+    app = BrokerClient("127.0.0.1", 4001, 2, contracts=ContractCache())
     app.register(print)
+    metrics = MetricsAggregator()
+    app.register(metrics)
     contract = app.buildContract("AMD", "STK", "SMART", "USD")
     fromDate = date(2020, 11, 1)
     toDate = date(2020, 11, 11)  # = date.today()
-    data = app.fetchHistoricalData(contract, fromDate, toDate, '1 min')
-    app.saveAsCsv(data, 'AMD')
+    # an interrupted download continues from its last completed chunk when started again
+    DownloadJob(app, contract, fromDate, toDate, '1 min', 'AMD.csv').run()
     app.disconnect()
+    metrics.exportJson('AMD_metrics.json')
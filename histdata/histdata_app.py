@@ -1,23 +1,22 @@
 import datetime
+import os
 import queue
 import sys
+from collections import deque
 from dataclasses import dataclass
 
 from PyQt5 import QtWidgets, QtCore, uic
 from dateutil.relativedelta import relativedelta
 
+from contracts import ContractCache
+from gapfill import GapFiller, BarStore
 from histdata import BrokerClient
 
-LOG_QUEUE = queue.Queue()
-FINISHED = object()
-
-
-def clearQueue():
-    LOG_QUEUE.mutex.acquire()
-    LOG_QUEUE.queue.clear()
-    LOG_QUEUE.all_tasks_done.notify_all()
-    LOG_QUEUE.unfinished_tasks = 0
-    LOG_QUEUE.mutex.release()
+STORE_DIRECTORY = "store"
+CONTRACTS_FILE_NAME = "contracts.json"
+LOG_FLUSH_MS = 100
+MAX_LOG_BATCH = 1000
+MAX_LOG_LINES = 5000
 
 
 class MainWindow(QtWidgets.QWidget):
@@ -26,6 +25,10 @@ class MainWindow(QtWidgets.QWidget):
         super(MainWindow, self).__init__(*args, **kwargs)
         uic.loadUi('histdata.ui', self)
         self.setFixedSize(600, 525)
+        self.logModel = LogListModel(MAX_LOG_LINES)
+        self.logView.setModel(self.logModel)
+        self.worker = None
+        self.logPump = None
         self.initControlValues()
         self.setConnections()
 
@@ -42,10 +45,14 @@ class MainWindow(QtWidgets.QWidget):
         self.downloadButton.clicked.connect(self.download)
 
     def clearLogs(self):
-        self.logView.clear()
+        self.logModel.clear()
 
-    def appendLog(self, message: str):
-        self.logView.addItem(message)
+    def appendLogs(self, messages: list):
+        scrollBar = self.logView.verticalScrollBar()
+        isAtBottom = scrollBar.value() == scrollBar.maximum()
+        self.logModel.appendMessages(messages)
+        if isAtBottom:
+            self.logView.scrollToBottom()
 
     def download(self):
         self.downloadButton.setEnabled(False)
@@ -58,48 +65,105 @@ class MainWindow(QtWidgets.QWidget):
         endDate = self.endDateEdit.date().toPyDate()
         barSize = self.barSizeComboBox.currentText()
 
-        clearQueue()
-        logPoller = LogQueuePoller(self.appendLog)
-        logPoller.start()
-        worker = DownloadHistDataTask(
+        # every download has its own log queue and pump, the pump stops when its download thread finishes
+        logs = queue.Queue()
+        self.logPump = LogPump(logs)
+        self.logPump.sig_messages.connect(self.appendLogs, QtCore.Qt.QueuedConnection)
+        self.worker = DownloadHistDataTask(
             ConnectionParams("127.0.0.1", 4001, 10),
             ContractParams(ticker, secType, exchange, currency),
-            HistInfoParams(fromDate, endDate, barSize)
+            HistInfoParams(fromDate, endDate, barSize),
+            logs
         )
-        worker.sig_error.connect(self.appendLog)
-        worker.sig_error.connect(lambda _: self.downloadButton.setEnabled(True))
-        worker.sig_done.connect(lambda _: self.downloadButton.setEnabled(True))
-        worker.start()
-        QtWidgets.QApplication.processEvents()
+        self.worker.finished.connect(self.logPump.stop)
+        self.worker.finished.connect(lambda: self.downloadButton.setEnabled(True))
+        self.logPump.start()
+        self.worker.start()
 
 
-class LogQueuePoller(QtCore.QThread):
-    def __init__(self, router):
-        super(LogQueuePoller, self).__init__()
-        self._router = router
+class LogListModel(QtCore.QAbstractListModel):
+    """Read only list of log lines which keeps only the last maxLines of them"""
 
-    def __del__(self):
-        self.wait()
+    def __init__(self, maxLines: int, parent=None):
+        super(LogListModel, self).__init__(parent)
+        self._lines = deque()
+        self._maxLines = maxLines
 
-    def run(self):
-        while True:
-            message = LOG_QUEUE.get()
-            if message == FINISHED:
-                LOG_QUEUE.task_done()
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._lines)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and index.isValid():
+            return self._lines[index.row()]
+        return None
+
+    def appendMessages(self, messages: list):
+        messages = messages[-self._maxLines:]
+        if not messages:
+            return
+        overflow = len(self._lines) + len(messages) - self._maxLines
+        if overflow > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self._lines.popleft()
+            self.endRemoveRows()
+        self.beginInsertRows(QtCore.QModelIndex(), len(self._lines), len(self._lines) + len(messages) - 1)
+        self._lines.extend(messages)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._lines.clear()
+        self.endResetModel()
+
+
+class LogPump(QtCore.QObject):
+    """
+    Drains a log queue filled by a download thread every LOG_FLUSH_MS on the GUI thread and hands the messages
+    over in batches, so the view is updated a few times a second whatever the number of messages
+    """
+    sig_messages = QtCore.pyqtSignal(list)
+
+    def __init__(self, logs: queue.Queue, parent=None):
+        super(LogPump, self).__init__(parent)
+        self._logs = logs
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(LOG_FLUSH_MS)
+        self._timer.timeout.connect(self.flush)
+
+    def start(self):
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+        while not self._logs.empty():
+            self.flush()
+
+    def flush(self):
+        messages = []
+        while len(messages) < MAX_LOG_BATCH:
+            try:
+                messages.append(self._logs.get_nowait())
+            except queue.Empty:
                 break
-            self._router(message)
-            LOG_QUEUE.task_done()
+        if messages:
+            print("\n".join(messages))
+            self.sig_messages.emit(messages)
 
 
 class DownloadHistDataTask(QtCore.QThread):
-    sig_done = QtCore.pyqtSignal(list, str)
+    sig_done = QtCore.pyqtSignal(object, str)
     sig_error = QtCore.pyqtSignal(str)
 
-    def __init__(self, connectionParams, contractParams, histInfoParam):
+    def __init__(self, connectionParams, contractParams, histInfoParam, logs: queue.Queue,
+                 storeDirectory=STORE_DIRECTORY):
         super(DownloadHistDataTask, self).__init__()
         self._cn = connectionParams
         self._ct = contractParams
         self._hip = histInfoParam
+        self._logs = logs
+        self._store = BarStore(storeDirectory)
+        self._contracts = ContractCache(os.path.join(storeDirectory, CONTRACTS_FILE_NAME))
 
     def __del__(self):
         self.wait()
@@ -108,48 +172,46 @@ class DownloadHistDataTask(QtCore.QThread):
         ib = BrokerClient(
             self._cn.ipAddress,
             self._cn.port,
-            self._cn.clientId
+            self._cn.clientId,
+            contracts=self._contracts
         )
         ib.register(self.routeLogs)
-        if not ib.lowLevelClient.isConnected():
-            self.sig_error.emit("Cannot connect to client")
-            ib.disconnect()
+        try:
+            if not ib.lowLevelClient.isConnected():
+                self.fail("Cannot connect to client")
+                return
+
+            contract = ib.buildContract(
+                self._ct.ticker,
+                self._ct.secType,
+                self._ct.exchange,
+                self._ct.currency
+            )
+            self.routeLogs("Downloading is started..")
+            summary = GapFiller(ib, self._store).fill(
+                contract,
+                self._ct.ticker,
+                self._hip.fromDate,
+                self._hip.endDate,
+                self._hip.barSize
+            )
+        except Exception as e:
+            # a failed contract lookup or range is reported like any other error, the client is disconnected below
+            self.fail(f"Downloading is failed: {e}")
             return
-
-        contract = ib.buildContract(
-            self._ct.ticker,
-            self._ct.secType,
-            self._ct.exchange,
-            self._ct.currency
-        )
-        self.routeLogs("Downloading is started..")
-        data = ib.fetchHistoricalData(
-            contract,
-            self._hip.fromDate,
-            self._hip.endDate,
-            self._hip.barSize
-        )
+        finally:
+            ib.disconnect()
         self.routeLogs("Downloading is finished")
-        fileName = self.buildFileName(
-            self._ct.ticker,
-            self._hip.fromDate,
-            self._hip.endDate,
-            self._hip.barSize
-        )
-        ib.saveAsCsv(data, fileName)
-        ib.disconnect()
-        self.sig_done.emit(data, fileName)
+        self.sig_done.emit(summary, summary.fileName)
+
+    def fail(self, message: str):
+        # errors go through the log queue too, so they are shown after the messages before them
+        self.routeLogs(message)
+        self.sig_error.emit(message)
 
     def routeLogs(self, message):
-        LOG_QUEUE.put(message)
-        print(message)
-
-    def buildFileName(self, ticker, endDate, fromDate, barSize):
-        delimiter = "_"
-        return delimiter.join([ticker.lower(),
-                               fromDate.strftime("%Y%m%d"),
-                               endDate.strftime("%Y%m%d"),
-                               barSize.replace(" ", "_")])
+        # instrumentation events come through the same bus and render as text
+        self._logs.put(str(message))
 
 
 @dataclass
@@ -0,0 +1,183 @@
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import List
+
+from histdata import BrokerClient, RequestError
+from sinks import FetchSummary
+
+JOURNAL_SUFFIX = '.journal'
+PART_SUFFIX = '.part'
+
+
+@dataclass
+class RetryPolicy:
+    """A failed chunk is retried up to retries times, waiting initialDelay, initialDelay * factor, ... seconds"""
+    retries: int = 5
+    initialDelay: float = 2.0
+    factor: float = 2.0
+    maxDelay: float = 120.0
+
+    def delays(self) -> List[float]:
+        return [min(self.initialDelay * self.factor ** attempt, self.maxDelay) for attempt in range(self.retries)]
+
+
+class DownloadJournal:
+    """
+    Append only json lines file. The first line describes the job, every next one a chunk that is completely
+    written to the part file. Every line is flushed to disk before the next chunk is written.
+    """
+
+    def __init__(self, fileName: str):
+        self.fileName = fileName
+
+    def read(self):
+        """:return: (job, chunk records), or (None, []) when there is no readable journal"""
+        try:
+            with open(self.fileName) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None, []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # the line being written when the process died
+                break
+        if not records:
+            return None, []
+        return records[0], records[1:]
+
+    def start(self, job: dict):
+        with open(self.fileName, 'w') as f:
+            self._writeLine(f, job)
+
+    def append(self, record: dict):
+        with open(self.fileName, 'a') as f:
+            self._writeLine(f, record)
+
+    def remove(self):
+        if os.path.exists(self.fileName):
+            os.remove(self.fileName)
+
+    @staticmethod
+    def _writeLine(f, record: dict):
+        f.write(json.dumps(record) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class DownloadJob:
+    """
+    Downloads a date range into a csv file chunk by chunk. Every chunk is appended to ``<fileName>.part`` and
+    recorded in ``<fileName>.journal``, a failed chunk is retried with exponential backoff and when it still fails
+    the job stops there. Running the same job again continues after the last recorded chunk, so the result has
+    either every chunk or no file at all, never a hole.
+    """
+
+    def __init__(self, client: BrokerClient, contract, fromDate, endDate, barSizeSetting: str, fileName: str,
+                 retry: RetryPolicy = None, sleep=time.sleep):
+        self._client = client
+        self._contract = contract
+        self._fromDate = fromDate
+        self._endDate = endDate
+        self._barSizeSetting = barSizeSetting
+        self._fileName = fileName
+        self._partFileName = fileName + PART_SUFFIX
+        self._journal = DownloadJournal(fileName + JOURNAL_SUFFIX)
+        self._retry = retry if retry is not None else RetryPolicy()
+        self._sleep = sleep
+
+    def describe(self) -> dict:
+        return {
+            'contract': self._contract.conId or self._contract.symbol,
+            'fromDate': str(self._fromDate),
+            'endDate': str(self._endDate),
+            'barSize': self._barSizeSetting,
+        }
+
+    def run(self) -> FetchSummary:
+        """
+        :return: summary of all the chunks, including the ones downloaded by an interrupted run
+        :raises RequestError: when a chunk fails after all retries, the next run resumes from it
+        """
+        chunks = self._client.splitIntoChunks(self._fromDate, self._endDate)
+        done = self._resume(chunks)
+        summary = FetchSummary(self._fileName, sum(record['bars'] for record in done), len(done))
+        if done:
+            self._client.notify(f"Resuming after {len(done)} of {len(chunks)} chunks, {summary.bars} bars")
+            summary.firstDateTime = next((record['first'] for record in done if record['first']), None)
+            summary.lastDateTime = next((record['last'] for record in reversed(done) if record['last']), None)
+
+        try:
+            for (endDateStr, durationStr), data in self._client.iterChunks(
+                    self._contract, chunks[len(done):], self._barSizeSetting, self._fetchWithRetries):
+                df = self._client.toDataFrame(data)
+                size = self._appendPart(df)
+                first = str(df['DateTime'].iat[0]) if len(df) else None
+                last = str(df['DateTime'].iat[-1]) if len(df) else None
+                self._journal.append({'end': endDateStr, 'duration': durationStr, 'bars': len(df), 'size': size,
+                                      'first': first, 'last': last})
+                summary.chunks += 1
+                summary.bars += len(df)
+                summary.firstDateTime = summary.firstDateTime or first
+                summary.lastDateTime = last or summary.lastDateTime
+        except RequestError as e:
+            self._client.notify(f"Download stopped after {summary.chunks} of {len(chunks)} chunks: {e}, "
+                                f"run it again to resume")
+            raise
+
+        if summary.bars:
+            os.replace(self._partFileName, self._fileName)
+        elif os.path.exists(self._partFileName):
+            os.remove(self._partFileName)
+        self._journal.remove()
+        self._client.notify(str(summary))
+        return summary
+
+    def _resume(self, chunks) -> List[dict]:
+        """Returns the journal records of the chunks already in the part file and cuts off anything after them"""
+        job, records = self._journal.read()
+        done = []
+        if job == self.describe():
+            for chunk, record in zip(chunks, records):
+                if (record['end'], record['duration']) != chunk:
+                    break
+                done.append(record)
+        size = done[-1]['size'] if done else 0
+        partSize = os.path.getsize(self._partFileName) if os.path.exists(self._partFileName) else 0
+        if done and partSize >= size:
+            if partSize > size:
+                with open(self._partFileName, 'r+') as f:
+                    f.truncate(size)
+        else:
+            done = []
+            if os.path.exists(self._partFileName):
+                os.remove(self._partFileName)
+        if not done:
+            self._journal.start(self.describe())
+        return done
+
+    def _appendPart(self, df) -> int:
+        """Appends the bars to the part file, flushed to disk, and returns its new size"""
+        size = os.path.getsize(self._partFileName) if os.path.exists(self._partFileName) else 0
+        if df.empty:
+            return size
+        with open(self._partFileName, 'a', newline='') as f:
+            df.to_csv(f, header=size == 0, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def _fetchWithRetries(self, contract, endDateStr, durationStr, barSizeSetting):
+        for attempt, delay in enumerate(self._retry.delays() + [None]):
+            try:
+                return self._client.fetchChunkChecked(contract, endDateStr, durationStr, barSizeSetting)
+            except RequestError as e:
+                if delay is None:
+                    raise
+                self._client.notify(f"Chunk ending {endDateStr} failed: {e}, retry {attempt + 1} of "
+                                    f"{self._retry.retries} in {delay:.0f} seconds")
+                self._sleep(delay)
@@ -0,0 +1,28 @@
+import threading
+
+
+class BarUpdateQueue:
+    """
+    Thread safe queue of bar updates which keeps only the latest version of every bar.
+    IB resends the current bar on every trade, a reader draining a few times per second gets one update per bar.
+    Bars are (date, open, high, low, close, volume) tuples as produced by the wrapper.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bars = {}
+
+    def put(self, bar):
+        with self._lock:
+            self._bars[bar[0]] = bar
+
+    def putAll(self, bars):
+        with self._lock:
+            for bar in bars:
+                self._bars[bar[0]] = bar
+
+    def drain(self) -> list:
+        """Returns the pending bars in time order and forgets them"""
+        with self._lock:
+            bars, self._bars = self._bars, {}
+        return sorted(bars.values(), key=lambda bar: int(bar[0]))
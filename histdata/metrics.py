@@ -0,0 +1,113 @@
+"""
+Structured instrumentation events sent through the Observable notification bus next to the text messages.
+
+Events render as log lines with str(), so observers which only print or show messages keep working.
+QuietEvent subclasses are the exception: they are only sent to observers with a true receivesQuietEvents
+attribute, log observers never see them. MetricsAggregator is an observer collecting the events, it can export
+the per request records as json.
+"""
+import json
+import time
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+HISTORICAL_DATA = 'historicalData'
+CONTRACT_DETAILS = 'contractDetails'
+
+
+@dataclass
+class RequestStarted:
+    reqId: int
+    kind: str
+    endDateTime: str = ''
+    duration: str = ''
+    barSize: str = ''
+    startedAt: float = field(default_factory=time.time)
+
+    def __str__(self):
+        details = ' '.join(part for part in [self.kind, self.endDateTime, self.duration, self.barSize] if part)
+        return f'Request {self.reqId} {details} started'
+
+
+@dataclass
+class RequestFinished:
+    reqId: int
+    kind: str
+    endDateTime: str
+    duration: str
+    barSize: str
+    startedAt: float
+    seconds: float
+    bars: int
+    timedOut: bool = False
+    failed: bool = False
+    error: Optional[str] = None
+
+    @classmethod
+    def of(cls, started: RequestStarted, bars: int, timedOut: bool, failed: bool, error: Optional[str] = None):
+        return cls(started.reqId, started.kind, started.endDateTime, started.duration, started.barSize,
+                   started.startedAt, time.time() - started.startedAt, bars, timedOut, failed, error)
+
+    def __str__(self):
+        status = 'timed out' if self.timedOut else 'failed' if self.failed else 'finished'
+        return f'Request {self.reqId} {self.kind} {status}: {self.bars} rows in {self.seconds:.2f} s'
+
+
+class QuietEvent:
+    """Base of the events which are not log lines, see the module documentation"""
+
+
+@dataclass
+class PacingWait:
+    """Notice of a wait long enough to tell the user about"""
+    seconds: float
+
+    def __str__(self):
+        return f'Waited {self.seconds:.1f} seconds for the pacing limits'
+
+
+@dataclass
+class PacingDelay(QuietEvent):
+    """Every wait for the pacing limits, however short"""
+    seconds: float
+
+
+class MetricsAggregator:
+    """Observer collecting RequestFinished and PacingDelay events, other messages are ignored"""
+    receivesQuietEvents = True
+
+    def __init__(self):
+        self.requests: List[RequestFinished] = []
+        self.pacingWaits: List[PacingDelay] = []
+
+    def __call__(self, message, *args, **kwargs):
+        if isinstance(message, RequestFinished):
+            self.requests.append(message)
+        elif isinstance(message, PacingDelay):
+            self.pacingWaits.append(message)
+
+    def summary(self) -> dict:
+        history = [request for request in self.requests if request.kind == HISTORICAL_DATA]
+        bars = sum(request.bars for request in history)
+        wallSeconds = max((request.startedAt + request.seconds for request in self.requests), default=0) \
+            - min((request.startedAt for request in self.requests), default=0)
+        requestSeconds = sum(request.seconds for request in history)
+        return {
+            'requests': len(self.requests),
+            'historicalRequests': len(history),
+            'bars': bars,
+            'wallSeconds': wallSeconds,
+            'barsPerSecond': bars / wallSeconds if wallSeconds else None,
+            'meanChunkSeconds': requestSeconds / len(history) if history else None,
+            'maxChunkSeconds': max((request.seconds for request in history), default=None),
+            'timeouts': sum(request.timedOut for request in self.requests),
+            'secondsLostToTimeouts': sum(request.seconds for request in self.requests if request.timedOut),
+            'failures': sum(request.failed for request in self.requests),
+            'pacingWaits': len(self.pacingWaits),
+            'pacingWaitSeconds': sum(wait.seconds for wait in self.pacingWaits),
+        }
+
+    def exportJson(self, fileName: str):
+        with open(fileName, 'w') as f:
+            json.dump({'summary': self.summary(), 'requests': [asdict(request) for request in self.requests]},
+                      f, indent=2)
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import deque, defaultdict
+
+# Historical data pacing limits, see https://interactivebrokers.github.io/tws-api/historical_limitations.html
+MAX_REQUESTS_PER_WINDOW = 60
+WINDOW_SECONDS = 10 * 60
+IDENTICAL_REQUEST_SECONDS = 15
+MAX_SAME_CONTRACT_REQUESTS = 5
+SAME_CONTRACT_SECONDS = 2
+
+
+class PacingScheduler:
+    """
+    Delays historical data requests so that they never break IB pacing rules:
+     - no more than 60 requests within any 10 minutes
+     - no identical request within 15 seconds
+     - no 6 or more requests for the same contract, exchange and tick type within 2 seconds
+
+    One scheduler can be shared by several threads and several client connections.
+    """
+
+    def __init__(self, maxRequests=MAX_REQUESTS_PER_WINDOW, windowSeconds=WINDOW_SECONDS,
+                 identicalRequestSeconds=IDENTICAL_REQUEST_SECONDS,
+                 maxSameContractRequests=MAX_SAME_CONTRACT_REQUESTS, sameContractSeconds=SAME_CONTRACT_SECONDS,
+                 clock=time.monotonic):
+        self._maxRequests = maxRequests
+        self._windowSeconds = windowSeconds
+        self._identicalRequestSeconds = identicalRequestSeconds
+        self._maxSameContractRequests = maxSameContractRequests
+        self._sameContractSeconds = sameContractSeconds
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._requests = deque()
+        self._identicalRequests = {}
+        self._contractRequests = defaultdict(deque)
+
+    def acquire(self, requestKey, contractKey) -> float:
+        """
+        Blocks until a request can be sent and books it
+
+        :param requestKey: hashable description of the request, equal keys are identical requests
+        :param contractKey: hashable (contract, exchange, tick type) description
+        :return: seconds spent waiting
+        """
+        started = self._clock()
+        with self._condition:
+            while True:
+                now = self._clock()
+                delay = self._delay(now, requestKey, contractKey)
+                if delay <= 0:
+                    self._book(now, requestKey, contractKey)
+                    return now - started
+                self._condition.wait(delay)
+
+    def _delay(self, now, requestKey, contractKey) -> float:
+        self._forget(now)
+        delays = [0.0]
+        if len(self._requests) >= self._maxRequests:
+            delays.append(self._requests[0] + self._windowSeconds - now)
+        if requestKey in self._identicalRequests:
+            delays.append(self._identicalRequests[requestKey] + self._identicalRequestSeconds - now)
+        contractRequests = self._contractRequests.get(contractKey)
+        if contractRequests and len(contractRequests) >= self._maxSameContractRequests:
+            delays.append(contractRequests[0] + self._sameContractSeconds - now)
+        return max(delays)
+
+    def _book(self, now, requestKey, contractKey):
+        self._requests.append(now)
+        self._identicalRequests[requestKey] = now
+        self._contractRequests[contractKey].append(now)
+
+    def _forget(self, now):
+        while self._requests and self._requests[0] <= now - self._windowSeconds:
+            self._requests.popleft()
+        for key in [key for key, sent in self._identicalRequests.items()
+                    if sent <= now - self._identicalRequestSeconds]:
+            del self._identicalRequests[key]
+        for key in list(self._contractRequests):
+            contractRequests = self._contractRequests[key]
+            while contractRequests and contractRequests[0] <= now - self._sameContractSeconds:
+                contractRequests.popleft()
+            if not contractRequests:
+                del self._contractRequests[key]
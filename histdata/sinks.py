@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from pandas import Timestamp
+
+
+@dataclass
+class FetchSummary:
+    fileName: str
+    bars: int = 0
+    chunks: int = 0
+    firstDateTime: Optional[Timestamp] = None
+    lastDateTime: Optional[Timestamp] = None
+
+    def __str__(self):
+        return f'{self.bars} bars in {self.chunks} chunks ({self.firstDateTime} - {self.lastDateTime}) ' \
+               f'saved as {self.fileName}'
+
@@ -0,0 +1,190 @@
+import csv
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from datetime import date
+from typing import List, Optional
+
+from contracts import ContractCache
+from gapfill import GapFiller, BarStore
+from histdata import BrokerClient
+from pacing import PacingScheduler
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 4001
+DEFAULT_FIRST_CLIENT_ID = 20
+DEFAULT_CLIENTS = 4
+DEFAULT_STORE_DIRECTORY = "store"
+DEFAULT_BAR_SIZE = "1 min"
+
+OK = 'ok'
+FAILED = 'failed'
+
+
+@dataclass
+class UniverseEntry:
+    ticker: str
+    fromDate: date
+    endDate: date
+    barSize: str = DEFAULT_BAR_SIZE
+    secType: str = "STK"
+    exchange: str = "SMART"
+    currency: str = "USD"
+
+    def contractSpec(self):
+        return self.ticker, self.secType, self.exchange, self.currency
+
+
+@dataclass
+class SymbolReport:
+    ticker: str
+    barSize: str
+    status: str = OK
+    bars: int = 0
+    chunks: int = 0
+    seconds: float = 0
+    clientId: Optional[int] = None
+    error: str = ''
+
+    def __str__(self):
+        text = f'{self.ticker:<8} {self.barSize:<8} {self.status:<6} {self.bars:>9} bars {self.seconds:>8.1f} s'
+        return f'{text}  {self.error}' if self.error else text
+
+
+def readUniverse(fileName: str) -> List[UniverseEntry]:
+    """
+    Universe csv with ticker, from and to columns (yyyy-mm-dd) and optional barSize, secType, exchange
+    and currency columns. An empty to means today.
+    """
+    entries = []
+    with open(fileName, newline='') as f:
+        for row in csv.DictReader(f):
+            optional = {name: row[name] for name in ['barSize', 'secType', 'exchange', 'currency'] if row.get(name)}
+            entries.append(UniverseEntry(
+                row['ticker'],
+                date.fromisoformat(row['from']),
+                date.fromisoformat(row['to']) if row.get('to') else date.today(),
+                **optional
+            ))
+    return entries
+
+
+@dataclass
+class _Worker:
+    clientId: int
+    client: BrokerClient
+
+
+class UniverseDownloader:
+    """
+    Refreshes a universe of contracts in the store with a pool of client connections, one per client id.
+    All connections share one pacing scheduler, so the pool as a whole stays within the IB pacing limits,
+    and a symbol is merged into the store as soon as its download is complete.
+    """
+
+    def __init__(self, store: BarStore, clientIds, ipaddress: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 pacing: PacingScheduler = None, contracts: ContractCache = None, log=print):
+        self._store = store
+        self._pacing = pacing if pacing is not None else PacingScheduler()
+        self._contracts = contracts if contracts is not None else ContractCache()
+        self._log = log
+        self._fileLocks = defaultdict(threading.Lock)
+        self._workers = []
+        for clientId in clientIds:
+            client = BrokerClient(ipaddress, port, clientId, pacing=self._pacing, contracts=self._contracts)
+            if not client.lowLevelClient.isConnected():
+                client.disconnect()
+                self._log(f"Client {clientId} cannot connect")
+                continue
+            client.register(self._clientLog(clientId))
+            self._workers.append(_Worker(clientId, client))
+        if not self._workers:
+            raise ConnectionError(f"Cannot connect to {ipaddress}:{port}")
+
+    def run(self, entries: List[UniverseEntry]) -> List[SymbolReport]:
+        """Downloads every entry and returns one report per entry, in the order of entries"""
+        contracts = self._workers[0].client.buildContracts([entry.contractSpec() for entry in entries])
+        tasks = queue.Queue()
+        for position, (entry, contract) in enumerate(zip(entries, contracts)):
+            tasks.put((position, entry, contract))
+
+        reports = [None] * len(entries)
+        threads = [threading.Thread(target=self._work, args=(worker, tasks, reports)) for worker in self._workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return reports
+
+    def close(self):
+        for worker in self._workers:
+            worker.client.disconnect()
+
+    def _work(self, worker: _Worker, tasks: queue.Queue, reports: list):
+        filler = GapFiller(worker.client, self._store)
+        while True:
+            try:
+                position, entry, contract = tasks.get_nowait()
+            except queue.Empty:
+                return
+            reports[position] = self._download(worker, filler, entry, contract)
+            self._log(str(reports[position]))
+
+    def _download(self, worker: _Worker, filler: GapFiller, entry: UniverseEntry, contract) -> SymbolReport:
+        report = SymbolReport(entry.ticker, entry.barSize, clientId=worker.clientId)
+        started = time.monotonic()
+        try:
+            if not contract.conId:
+                raise ValueError("contract is not resolved")
+            # the same ticker and bar size listed twice must not merge into one store file at once
+            with self._fileLocks[self._store.path(entry.ticker, entry.barSize)]:
+                summary = filler.fill(contract, entry.ticker, entry.fromDate, entry.endDate, entry.barSize)
+            report.bars = summary.bars
+            report.chunks = summary.chunks
+        except Exception as e:
+            report.status = FAILED
+            report.error = str(e)
+        report.seconds = time.monotonic() - started
+        return report
+
+    def _clientLog(self, clientId: int):
+        return lambda message, *args, **kwargs: self._log(f'[{clientId}] {message}')
+
+
+def saveReport(reports: List[SymbolReport], fileName: str):
+    with open(fileName, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(SymbolReport.__dataclass_fields__))
+        writer.writeheader()
+        for report in reports:
+            writer.writerow(asdict(report))
+
+
+def usage():
+    print("Usage:  python3 universe.py universe_file [report_file] [first_client_id] [clients]")
+    print("        universe_file is a csv with ticker,from,to[,barSize,secType,exchange,currency] columns")
+    sys.exit()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) <= 1:
+        usage()
+
+    universe_file = sys.argv[1]
+    report_file = sys.argv[2] if len(sys.argv) > 2 else 'universe_report.csv'
+    first_client_id = int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_FIRST_CLIENT_ID
+    clients = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_CLIENTS
+
+    downloader = UniverseDownloader(BarStore(DEFAULT_STORE_DIRECTORY),
+                                    range(first_client_id, first_client_id + clients))
+    try:
+        reports = downloader.run(readUniverse(universe_file))
+    finally:
+        downloader.close()
+    saveReport(reports, report_file)
+    failed = [report for report in reports if report.status == FAILED]
+    print(f"{len(reports) - len(failed)} symbol(s) downloaded, {len(failed)} failed, report saved to {report_file}")
+    for report in reports:
+        print(report)
@@ -1,15 +1,15 @@
+import os
 import sys
 from collections import OrderedDict
 
 import calplot
-import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from backtest import barcache
 
 
 def loadData(filename: str):
-    df = pd.read_csv(filename, usecols=['DateTime', 'Open', 'High', 'Low', 'Close', 'Volume'], na_values=['nan'])
-    df['DateTime'] = pd.to_datetime(df['DateTime'], utc=True).dt.tz_convert('US/Eastern')
-    df = df.set_index('DateTime')
-    return df
+    return barcache.loadFrame(filename, tz='US/Eastern').set_index('DateTime')
 
 
 def resample(df):
@@ -1,20 +1,29 @@
+import os
 import sys
+import tempfile
 
-import pandas as pd
 import calplot
 from matplotlib.figure import Figure
-from pandas import DataFrame
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from backtest import barcache
+from backtest.merge import mergeFiles, DayCoverage, POLICIES, PREFER_LAST
 
-def loadData(filename: str):
-    df = pd.read_csv(filename, usecols=['DateTime', 'Open', 'High', 'Low', 'Close', 'Volume'], na_values=['nan'])
-    df['DateTime'] = pd.to_datetime(df['DateTime'], utc=True).dt.tz_convert('US/Eastern')
-    return df.set_index('DateTime')
+POLICY_OPTION = '--policy='
+# days of the coverage statistics and of the hitmap
+COVERAGE_TZ = 'US/Eastern'
 
 
-def createFilePrefix(data_frame):
-    minDateTime = min(data_frame.index).date().strftime("%Y%m%d")
-    maxDateTime = max(data_frame.index).date().strftime("%Y%m%d")
+def usage():
+    print(f"Usage:  python3 merger.py [{POLICY_OPTION}{'|'.join(POLICIES)}] file [file ...]")
+    print(f"        the policy picks the file winning duplicated timestamps, {PREFER_LAST} by default")
+    sys.exit()
+
+
+def createFilePrefix(coverage: DayCoverage):
+    days = list(coverage.counts)
+    minDateTime = days[0].replace("-", "")
+    maxDateTime = days[-1].replace("-", "")
     return maxDateTime + "_" + minDateTime
 
 
@@ -22,24 +31,30 @@ def saveHitmap(file_prefix: str, figure: Figure):
     figure.savefig(f"{file_prefix}_hitmap.png")
 
 
-def saveDebugStat(file_prefix: str, data_frame: DataFrame):
-    data_frame.groupby(data_frame.index.date).count().to_csv(f'{file_prefix}_stat.csv')
-
-
-def saveMergedData(file_prefix: str, data_frame: DataFrame):
-    data_frame.to_csv(f'{file_prefix}_merged.csv')
+def saveDebugStat(file_prefix: str, coverage: DayCoverage):
+    coverage.toFrame().to_csv(f'{file_prefix}_stat.csv')
 
 
 if __name__ == '__main__':
     filenames = sys.argv[1:]
-    dfs = [loadData(filename) for filename in filenames]
-    df = pd.concat(dfs, join='outer')
-    df['hasDay'] = 1
-    df.drop_duplicates(inplace=True)
-    df.sort_index(inplace=True)
-    fig, _ = calplot.calplot(df['hasDay'], cmap='Blues', colorbar=False)
-
-    prefix = createFilePrefix(df)
-    saveMergedData(prefix, df)
+    policy = PREFER_LAST
+    if filenames and filenames[0].startswith(POLICY_OPTION):
+        policy = filenames.pop(0)[len(POLICY_OPTION):]
+    if not filenames or policy not in POLICIES:
+        usage()
+
+    coverage = DayCoverage(barcache.COLUMNS + ['hasDay'], COVERAGE_TZ)
+    # unique per run, concurrent merges in one directory do not overwrite each other
+    handle, tmpFileName = tempfile.mkstemp(suffix='.csv', prefix='merging', dir='.')
+    os.close(handle)
+    mergeFiles(filenames, tmpFileName, policy, coverage, constantColumns={'hasDay': 1}, tz=COVERAGE_TZ)
+    if not coverage.counts:
+        os.remove(tmpFileName)
+        print("Nothing to merge")
+        sys.exit()
+
+    prefix = createFilePrefix(coverage)
+    os.replace(tmpFileName, f'{prefix}_merged.csv')
+    fig, _ = calplot.calplot(coverage.days(), cmap='Blues', colorbar=False)
     saveHitmap(prefix, fig)
-    # saveDebugStat(prefix, df)
+    saveDebugStat(prefix, coverage)
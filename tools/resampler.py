@@ -1,13 +1,24 @@
+import os
 import sys
-from collections import OrderedDict
 
-import pandas as pd
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from backtest import barcache
+from backtest.resample import resampleBars, resampleChunks
 
 
 def usage():
-    print("Usage:  python3 resampler.py from_file to_file resampling_value")
+    print("Usage:  python3 resampler.py from_file to_file resampling_value [chunk_rows]")
+    print("        with chunk_rows the file is resampled chunk by chunk and never loaded as a whole")
     sys.exit()
 
+
+def resampleInChunks(from_file_path: str, to_file_path: str, resampling_value: str, chunk_rows: int):
+    header = True
+    for df in resampleChunks(barcache.iterCsv(from_file_path, chunk_rows, tz='US/Eastern'), resampling_value):
+        df.to_csv(to_file_path, mode='w' if header else 'a', header=header)
+        header = False
+
+
 if __name__ == '__main__':
     if len(sys.argv) <= 3:
         usage()
@@ -15,23 +26,16 @@ if __name__ == '__main__':
     from_file_path = sys.argv[1]
     to_file_path = sys.argv[2]
     resampling_value = sys.argv[3]
+    chunk_rows = int(sys.argv[4]) if len(sys.argv) > 4 else None
 
-    if from_file_path == from_file_path:
+    if from_file_path == to_file_path:
         print("Error: FROM and TO files are the same")
         usage()
 
-    df = pd.read_csv(from_file_path, usecols=['DateTime', 'Open', 'High', 'Low', 'Close', 'Volume'], na_values=['nan'])
-    df['DateTime'] = pd.to_datetime(df['DateTime'], utc=True).dt.tz_convert('US/Eastern')
-    df = df.set_index('DateTime')
-    df = df.resample(resampling_value).agg(
-        OrderedDict([
-            ('Open', 'first'),
-            ('High', 'max'),
-            ('Low', 'min'),
-            ('Close', 'last'),
-            ('Volume', 'sum'),
-        ])
-    ).dropna()
-
-    df.to_csv(to_file_path)
-    print(f"Saved to {to_file_path}")
\ No newline at end of file
+    if chunk_rows:
+        resampleInChunks(from_file_path, to_file_path, resampling_value, chunk_rows)
+    else:
+        df = barcache.loadFrame(from_file_path, tz='US/Eastern').set_index('DateTime')
+        df = resampleBars(df, resampling_value)
+        df.to_csv(to_file_path)
+    print(f"Saved to {to_file_path}")
@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from backtest.sweep import runSweep, combineSymbols
+
+
+def usage():
+    print("Usage:  python3 sweep.py entry_offsets stop_distances to_file from_file [from_file ...]")
+    print("        offsets and distances are comma separated lists, e.g. 0.1,0.2,0.5")
+    sys.exit()
+
+
+def parseValues(text: str):
+    return [float(value) for value in text.split(",") if value]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) <= 4:
+        usage()
+
+    entry_offsets = parseValues(sys.argv[1])
+    stop_distances = parseValues(sys.argv[2])
+    to_file_path = sys.argv[3]
+    from_file_paths = sys.argv[4:]
+
+    summary = runSweep(from_file_paths, entry_offsets, stop_distances)
+    summary.to_csv(to_file_path, index=False)
+    combineSymbols(summary).to_csv(f'{to_file_path}_total.csv', index=False)
+    print(f"Saved to {to_file_path}")